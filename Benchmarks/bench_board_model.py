@@ -0,0 +1,80 @@
+"""
+Time of board pipelines on lxml trees (geometry / scale modules) versus the array-backed BoardModel.
+
+Usage: python bench_board_model.py [board.brd ...]
+Each board is flattened, then NUM_STEPS times rotated+moved and scaled. The lxml pipeline parses and
+formats the attributes at every step, the BoardModel is converted from/to lxml only once. Flattening
+itself is also timed both ways (flatten_board versus flatten_board_model + BoardModel.to_board).
+Without arguments, synthetic boards are used (see bench_flatten.py).
+"""
+import os, sys, copy, time
+
+this_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(this_dir, ".."))
+from BoardOperations.constants import *
+from BoardOperations import brdFile, flatten, geometry, scale, rotate
+from BoardOperations.boardModel import BoardModel
+from BoardOperations.packageCache import PackageCache
+from bench_flatten import make_board
+
+NUM_RUNS = 3
+NUM_STEPS = 5
+ELEMENT_COUNTS = [100, 800, 3200]
+ROTATION = rotate.parse_rotation('MR90')
+
+def get_containers(root):
+   return [root.findall('.//drawing/board/plain')[0]] + list(root.findall('.//drawing/board/signals')[0])
+
+def lxml_pipeline(root):
+   for _ in range(NUM_STEPS):
+      for container in get_containers(root):
+         geometry.transform_elements(list(container), rot=ROTATION, offset=(1.5, 2.5))
+         scale.scale_elements(list(container), 1.01)
+
+def model_pipeline(root):
+   model = BoardModel.from_board(root)
+   for _ in range(NUM_STEPS):
+      model.transform(rot=ROTATION, offset=(1.5, 2.5))
+      model.scale(1.01)
+   model.to_board(root)
+
+def model_conversion(root):
+   BoardModel.from_board(root).to_board(root)
+
+def lxml_flatten(root):
+   flatten.flatten_board(root, PackageCache())
+
+def model_flatten(root):
+   flatten.flatten_board_model(root, PackageCache()).to_board(root)
+
+def best_time(function, root):
+   best = None
+   for _ in range(NUM_RUNS):
+      board = copy.deepcopy(root)
+      start = time.perf_counter()
+      function(board)
+      elapsed = time.perf_counter() - start
+      best = elapsed if best is None else min(best, elapsed)
+   return best
+
+def report(name, root):
+   flattened = copy.deepcopy(root)
+   flatten.flatten_board(flattened, PackageCache())
+   num_elements = sum(len(container) for container in get_containers(flattened))
+   print(f"{name} ({num_elements} flattened elements)")
+   for label, function, board in [
+         ("flatten, lxml", lxml_flatten, root),
+         ("flatten, BoardModel", model_flatten, root),
+         (f"{NUM_STEPS} transform+scale steps, lxml", lxml_pipeline, flattened),
+         (f"{NUM_STEPS} transform+scale steps, BoardModel", model_pipeline, flattened),
+         ("lxml -> BoardModel -> lxml only", model_conversion, flattened)]:
+      print(f"   {label:45} {best_time(function, board)*1000:10.1f} ms")
+
+if __name__ == "__main__":
+   if len(sys.argv) > 1:
+      for file_name in sys.argv[1:]:
+         root = brdFile.read_board_root(file_name)
+         report(os.path.basename(file_name), root)
+   else:
+      for num_elements in ELEMENT_COUNTS:
+         report(f"synthetic board, {num_elements} placed packages", make_board(num_elements))
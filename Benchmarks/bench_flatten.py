@@ -0,0 +1,114 @@
+"""
+Time to condense (and flatten) Eagle boards with getCondensedBoardFromEagle.
+
+Usage: python bench_flatten.py [board.brd ...]
+Without arguments, synthetic boards of growing size are used: every board has NUM_LIBRARIES
+libraries of NUM_PACKAGES packages (pads, smds, wires, ...), NUM_SIGNALS signals, and a number of
+placed elements. The time per element should stay flat as the boards grow.
+
+Each board is condensed twice: as flatten_board does it, filtering <plain> and <signals> once, and
+with the baseline, which filters them again before dispatching every placed element (what
+dispatch_elements used to do, O(elements x (plain + signals))). Filtering is idempotent, so both
+produce the same board.
+"""
+import os, sys, copy, random, time
+from unittest import mock
+import lxml.etree as etree
+
+this_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(this_dir, ".."))
+from BoardOperations.constants import *
+from BoardOperations import brdFile, flatten
+from BoardOperations.packageCache import PackageCache
+
+NUM_RUNS = 3
+NUM_LIBRARIES = 5
+NUM_PACKAGES = 10
+NUM_SIGNALS = 50
+NUM_PLAIN_WIRES = 200
+ELEMENT_COUNTS = [100, 200, 400, 800]
+
+def make_package(name, rng):
+   '''Returns a package definition with pads, smds and a few drawing elements'''
+   package = etree.Element(PACKAGE, {NAME: name})
+   etree.SubElement(package, DESCRIPTION).text = name
+   for i in range(8):
+      etree.SubElement(package, SMD, {NAME: f'S{i}', X: str(i*1.27), Y: '0.5', DX: '0.6', DY: '1.2',
+         LAYER: rng.choice(['1', '16']), ROTATION: rng.choice(['R0', 'R90', 'R180'])})
+   for i in range(4):
+      etree.SubElement(package, PAD, {NAME: f'P{i}', X: str(i*2.54), Y: '-2', DRILL: '0.8',
+         SHAPE: rng.choice(['round', 'square', 'octagon', 'long', 'offset'])})
+   etree.SubElement(package, WIRE, {X1: '-1', Y1: '-1', X2: '5', Y2: '-1', WIDTH: '0.2', LAYER: '21'})
+   etree.SubElement(package, WIRE, {X1: '-1', Y1: '-1', X2: '-1', Y2: '3', WIDTH: '0.2', LAYER: '1'})
+   etree.SubElement(package, RECTANGLE, {X1: '0', Y1: '0', X2: '1', Y2: '2', LAYER: '29', ROTATION: 'R90'})
+   etree.SubElement(package, CIRCLE, {X: '0', Y: '0', RADIUS: '1', WIDTH: '0.1', LAYER: '21'})
+   etree.SubElement(package, HOLE, {X: '3', Y: '3', DRILL: '1'})
+   return package
+
+def make_board(num_elements, seed=0):
+   '''Returns a synthetic Eagle board with num_elements placed packages'''
+   rng = random.Random(seed)
+   root = brdFile.read_board_root(os.path.join(this_dir, "..", "templates", "empty_board.brd"))
+   board = root.find('.//'+BOARD)
+   plain = board.find(PLAIN)
+   for i in range(NUM_PLAIN_WIRES):
+      etree.SubElement(plain, WIRE, {X1: str(i), Y1: '0', X2: str(i), Y2: '50', WIDTH: '0.254',
+         LAYER: rng.choice(['20', '21', '1'])})
+
+   libraries = board.find('libraries')
+   package_names = []
+   for l in range(NUM_LIBRARIES):
+      library = etree.SubElement(etree.SubElement(libraries, LIBRARY, {NAME: f'lib{l}'}), 'packages')
+      for p in range(NUM_PACKAGES):
+         library.append(make_package(f'pkg{p}', rng))
+         package_names.append((f'lib{l}', f'pkg{p}'))
+
+   elements = etree.SubElement(board, 'elements')
+   for e in range(num_elements):
+      library_name, package_name = rng.choice(package_names)
+      etree.SubElement(elements, ELEMENT, {NAME: f'U{e}', LIBRARY: library_name, PACKAGE: package_name,
+         X: str(rng.uniform(0, 100)), Y: str(rng.uniform(0, 80)), ROTATION: rng.choice(['R0', 'R90', 'MR180'])})
+
+   signals = etree.SubElement(board, SIGNALS)
+   for s in range(NUM_SIGNALS):
+      signal = etree.SubElement(signals, SIGNAL, {NAME: f'N{s}'})
+      etree.SubElement(signal, CONTACTREF, {ELEMENT: 'U0', PAD: 'P0'})
+      etree.SubElement(signal, WIRE, {X1: str(s), Y1: '0', X2: str(s+1), Y2: '5', WIDTH: '0.2', LAYER: '1'})
+      etree.SubElement(signal, VIA, {X: str(s), Y: '5', EXTENT: '1-16', DRILL: '0.4'})
+   return root
+
+def dispatch_elements_per_element(plains, signals, placed_and_rotated_package, refdes):
+   '''The baseline dispatch_elements: re-filters the whole board before appending each package'''
+   flatten.filter_child_elements(plains)
+   for signal in signals:
+      flatten.filter_child_elements(signal)
+   dispatch_elements(plains, signals, placed_and_rotated_package, refdes)
+
+dispatch_elements = flatten.dispatch_elements
+
+def condense_time(root):
+   '''Returns the best time to condense a copy of the board over NUM_RUNS runs (packages are not cached between runs)'''
+   best = None
+   for _ in range(NUM_RUNS):
+      board = copy.deepcopy(root)
+      start = time.perf_counter()
+      brdFile.getCondensedBoardFromEagle(board, flatten_board=True, package_cache=PackageCache())
+      elapsed = time.perf_counter() - start
+      best = elapsed if best is None else min(best, elapsed)
+   return best
+
+def report(name, root):
+   num_elements = len(root.findall('.//'+ELEMENT))
+   elapsed = condense_time(root)
+   with mock.patch.object(flatten, 'dispatch_elements', dispatch_elements_per_element):
+      baseline = condense_time(root)
+   print(f"{name:24} {num_elements:6} elements {baseline*1000:10.1f} ms baseline {elapsed*1000:10.1f} ms "
+         f"{elapsed*1e6/max(num_elements, 1):8.1f} us/element {baseline/elapsed:6.2f}x")
+
+if __name__ == "__main__":
+   if len(sys.argv) > 1:
+      for file_name in sys.argv[1:]:
+         report(os.path.basename(file_name), brdFile.read_board_root(file_name))
+   else:
+      for num_elements in ELEMENT_COUNTS:
+         report("synthetic board", make_board(num_elements))
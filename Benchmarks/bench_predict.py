@@ -0,0 +1,48 @@
+"""
+Per-token latency of model.predict vs. the compiled FastPredictor, on CPU.
+
+Both models are built with random weights (the latency does not depend on the weights):
+- textgenrnn with the configuration/vocabulary used by the Web app
+- GPT Mini with the sizes used in gpt_train.py
+"""
+import os, sys, json, time
+os.environ['CUDA_VISIBLE_DEVICES'] = '-1'
+import numpy as np
+
+this_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(this_dir, ".."))
+sys.path.append(os.path.join(this_dir, "..", "GPT_Mini"))
+from Textgenrnn.model import textgenrnn_model
+from ModelInference.predictor import FastPredictor
+from gpt_model import create_gpt_model
+
+NUM_TOKENS = 200
+
+def time_per_token(predict, x, num_tokens=NUM_TOKENS):
+   '''Returns the average latency (ms) of a predict call, after a warm-up call'''
+   predict(x)
+   start = time.perf_counter()
+   for _ in range(num_tokens):
+      predict(x)
+   return (time.perf_counter() - start) * 1000.0 / num_tokens
+
+def report(name, model, x):
+   predictor = FastPredictor(model)
+   before = time_per_token(lambda x: model.predict(x, batch_size=1, verbose=0), x)
+   after = time_per_token(predictor.predict, x)
+   print(f"{name:12} model.predict: {before:8.2f} ms/token   FastPredictor: {after:8.2f} ms/token   speedup: {before/after:5.1f}x")
+
+if __name__ == "__main__":
+   textgenrnn_folder = os.path.join(this_dir, "..", "Textgenrnn")
+   with open(os.path.join(textgenrnn_folder, "eagleCompact128bi_config.json"), 'r', encoding='utf-8') as f:
+      cfg = json.load(f)
+   with open(os.path.join(textgenrnn_folder, "eagleCompact_vocab.json"), 'r', encoding='utf-8') as f:
+      vocab = json.load(f)
+   model = textgenrnn_model(len(vocab) + 1, cfg=cfg)
+   x = np.random.randint(1, len(vocab) + 1, size=(1, cfg['max_length']))
+   report("textgenrnn", model, x)
+
+   maxlen = 160
+   model = create_gpt_model(len(vocab) + 2, maxlen, 256, 2, 256)
+   x = np.random.randint(1, len(vocab) + 2, size=(1, maxlen)).astype('int32')
+   report("GPT Mini", model, x)
@@ -0,0 +1,98 @@
+"""
+Latency and memory of the rasterizer backends (see BoardOperations/rasterize.py), at the same output
+resolution (rasterize.DEFAULT_WIDTH pixels wide).
+
+Usage: python bench_rasterize.py [--backends cairo,imagemagick,pool] [board.brd ...]
+The boards are condensed, flattened and rendered to SVG once, then every backend rasterizes each SVG
+NUM_RUNS times. Each backend runs in a process of its own, which reports its startup time, the median
+latency per board, and the peak memory (RSS) of the process and of its children (ImageMagick
+processes, pool workers). Without board files, synthetic boards are used (see bench_flatten.py).
+"""
+import os, sys, time, argparse, statistics, struct
+import multiprocessing
+try:
+   import resource
+except ImportError:   # Windows, peak memory is not reported
+   resource = None
+
+this_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(this_dir, ".."))
+from BoardOperations import brdFile, render, rasterize
+from bench_flatten import make_board
+
+NUM_RUNS = 5
+ELEMENT_COUNTS = [100, 800]
+
+def get_png_size(png_bytes):
+   '''Returns (width, height) from the IHDR chunk of a PNG'''
+   return struct.unpack('>II', png_bytes[16:24])
+
+def get_peak_memory():
+   '''Returns the peak RSS (MB) of this process and of its terminated children'''
+   if resource is None:
+      return None, None
+   # ru_maxrss is in kilobytes on Linux, in bytes on macOS
+   unit = 1024 * 1024 if sys.platform == 'darwin' else 1024
+   return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / unit,
+      resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / unit)
+
+def run_backend(backend_name, svgs, results):
+   '''Rasterizes all the svgs with one backend (in a process of its own), puts its statistics in results'''
+   try:
+      memory_before, _ = get_peak_memory()
+      start = time.perf_counter()
+      rasterizer = rasterize.get_rasterizer(backend_name)
+      startup = time.perf_counter() - start
+      latencies, sizes = [], []
+      with rasterizer:
+         for name, svg_bytes in svgs:
+            times = []
+            for _ in range(NUM_RUNS):
+               start = time.perf_counter()
+               png_bytes = rasterizer.rasterize(svg_bytes)
+               times.append(time.perf_counter() - start)
+            latencies.append(statistics.median(times))
+            sizes.append(get_png_size(png_bytes))
+      memory_self, memory_children = get_peak_memory()
+      results.put((backend_name, None, startup, latencies, sizes,
+         None if memory_self is None else memory_self - memory_before, memory_children))
+   except Exception as e:
+      results.put((backend_name, f"{type(e).__name__}: {e}", None, None, None, None, None))
+
+def report(backend_result, svgs):
+   backend_name, error, startup, latencies, sizes, memory_self, memory_children = backend_result
+   if error is not None:
+      print(f"{backend_name:12} unavailable: {error}")
+      return
+   memory = "n/a" if memory_self is None else f"+{memory_self:.1f} MB self, {memory_children:.1f} MB children"
+   print(f"{backend_name:12} startup {startup*1000:8.1f} ms, peak memory {memory}")
+   for (name, _), latency, (width, height) in zip(svgs, latencies, sizes):
+      print(f"   {name:40} {width}x{height} {latency*1000:10.1f} ms")
+
+def get_svg(root):
+   board = brdFile.getCondensedBoardFromEagle(root, flatten_board=True)
+   return render.convertCondensedBoardToSvgString(board).encode('utf-8')
+
+if __name__ == "__main__":
+   parser = argparse.ArgumentParser(description="Latency and memory of the rasterizer backends")
+   parser.add_argument('boards', nargs='*', help="board files (default: synthetic boards)")
+   parser.add_argument('--backends', default=','.join(rasterize.RASTERIZERS))
+   args = parser.parse_args()
+
+   if len(args.boards) > 0:
+      svgs = [(os.path.basename(file_name), get_svg(brdFile.read_board_root(file_name))) for file_name in args.boards]
+   else:
+      svgs = [(f"synthetic board, {num_elements} placed packages", get_svg(make_board(num_elements)))
+         for num_elements in ELEMENT_COUNTS]
+   for name, svg_bytes in svgs:
+      print(f"{name}: {len(svg_bytes)/1000:.1f} kB of SVG")
+
+   # a fresh process per backend, so the peak memory of one does not hide the others
+   context = multiprocessing.get_context('spawn')
+   results = context.Queue()
+   for backend_name in args.backends.split(','):
+      process = context.Process(target=run_backend, args=(backend_name, svgs, results))
+      process.start()
+      backend_result = results.get()
+      process.join()
+      report(backend_result, svgs)
@@ -0,0 +1,81 @@
+"""
+Time of the rotations done while flattening packages: transform_smd / transform_pad on boards made
+mostly of SMDs and pads, and rotate.rotate on single points.
+
+Usage: python bench_rotate.py [board.brd ...]
+Each benchmark is run twice: with the exact lookup table for multiples of 90 degrees
+(geometry.ORTHOGONAL_ROTATIONS), and with the table emptied, so every rotation goes through the
+general trigonometry path.
+"""
+import os, sys, random, time
+from unittest import mock
+
+this_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(this_dir, ".."))
+import lxml.etree as etree
+from BoardOperations.constants import *
+from BoardOperations import brdFile, flatten, geometry, rotate
+
+NUM_RUNS = 5
+NUM_PADS = 20000
+NUM_POINTS = 200000
+ROTATIONS = ['R0', 'R90', 'R180', 'R270', 'MR0', 'MR90', 'MR180', 'MR270']
+
+def make_pads(num_pads, seed=0):
+   '''Returns num_pads smd and pad elements, in all the orthogonal orientations'''
+   rng = random.Random(seed)
+   pads = []
+   for i in range(num_pads):
+      x, y = str(round(rng.uniform(-20, 20), 3)), str(round(rng.uniform(-20, 20), 3))
+      if i % 2 == 0:
+         pads.append(etree.Element(SMD, {NAME: f'S{i}', X: x, Y: y, DX: '0.6', DY: '1.2',
+            LAYER: rng.choice(['1', '16']), ROTATION: rng.choice(ROTATIONS)}))
+      else:
+         pads.append(etree.Element(PAD, {NAME: f'P{i}', X: x, Y: y, DRILL: '0.8',
+            SHAPE: rng.choice(['round', 'square', 'octagon', 'long', 'offset']), ROTATION: rng.choice(ROTATIONS)}))
+   return pads
+
+def read_pads(file_name):
+   '''Returns the smd and pad elements of all the packages of a board'''
+   root = brdFile.read_board_root(file_name)
+   return root.findall('.//'+PACKAGE+'/'+SMD) + root.findall('.//'+PACKAGE+'/'+PAD)
+
+def transform_pads(pads):
+   for pad in pads:
+      if pad.tag == SMD:
+         flatten.transform_smd(pad)
+      else:
+         flatten.transform_pad(pad)
+
+def rotate_points(points):
+   for point, rot in points:
+      rotate.rotate(point, rot, (1.0, 2.0))
+
+def best_time(function, argument):
+   best = None
+   for _ in range(NUM_RUNS):
+      start = time.perf_counter()
+      function(argument)
+      elapsed = time.perf_counter() - start
+      best = elapsed if best is None else min(best, elapsed)
+   return best
+
+def report(name, function, argument, count):
+   table = best_time(function, argument)
+   with mock.patch.dict(geometry.ORTHOGONAL_ROTATIONS, clear=True):
+      trig = best_time(function, argument)
+   print(f"{name:40} {count:8} {trig*1e6/count:10.2f} us trig {table*1e6/count:10.2f} us table {trig/table:6.2f}x")
+
+if __name__ == "__main__":
+   if len(sys.argv) > 1:
+      for file_name in sys.argv[1:]:
+         pads = read_pads(file_name)
+         report(os.path.basename(file_name), transform_pads, pads, len(pads))
+   else:
+      pads = make_pads(NUM_PADS)
+      report("transform_smd/transform_pad", transform_pads, pads, len(pads))
+
+   rng = random.Random(0)
+   points = [((rng.uniform(-50, 50), rng.uniform(-50, 50)), rotate.read_rotation(etree.Element(PAD, {ROTATION: rng.choice(ROTATIONS)})))
+      for _ in range(NUM_POINTS)]
+   report("rotate.rotate", rotate_points, points, len(points))
@@ -0,0 +1,68 @@
+"""
+Throughput of concurrent textgenrnn generations: one generation at a time (each request runs its own
+batch-of-1 loop while holding the model), versus the continuous batching textgenrnn_scheduler.
+
+The model is built with random weights (the latency does not depend on the weights), with the
+configuration/vocabulary used by the Web app. The meta token is never sampled, so every text has
+exactly NUM_TOKENS tokens.
+"""
+import os, sys, json, time, threading
+os.environ['CUDA_VISIBLE_DEVICES'] = '-1'
+
+this_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(this_dir, ".."))
+from ModelInference.sampler import Sampler
+from Textgenrnn import textgenrnn
+from Textgenrnn.utils import textgenrnn_generate_batch
+from Textgenrnn.scheduler import textgenrnn_scheduler
+
+NUM_TOKENS = 100
+CONCURRENCY = [1, 4, 16]
+PREFIX = 'D B N '
+
+def run_concurrently(generate, concurrency):
+   '''Runs generate() in concurrency threads, returns the wall time (s) and the mean latency (s)'''
+   latencies = []
+   def worker():
+      start = time.perf_counter()
+      generate()
+      latencies.append(time.perf_counter() - start)
+   threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+   start = time.perf_counter()
+   for thread in threads:
+      thread.start()
+   for thread in threads:
+      thread.join()
+   return time.perf_counter() - start, sum(latencies) / len(latencies)
+
+def report(name, generate, concurrency):
+   wall, latency = run_concurrently(generate, concurrency)
+   tokens_per_second = concurrency * NUM_TOKENS / wall
+   print(f"{name:16} {concurrency:4} requests   {tokens_per_second:8.1f} tokens/s   mean latency {latency:7.2f} s")
+
+if __name__ == "__main__":
+   textgenrnn_folder = os.path.join(this_dir, "..", "Textgenrnn")
+   textgen = textgenrnn(name="eagleCompact128bi", weights_path='Skip',
+                        config_path=os.path.join(textgenrnn_folder, "eagleCompact128bi_config.json"),
+                        vocab_path=os.path.join(textgenrnn_folder, "eagleCompact_vocab.json"))
+   textgen.META_TOKEN = '|'
+   max_gen_length = NUM_TOKENS + len(PREFIX) + 1
+   sampler = Sampler(excluded_indices=(0, textgen.vocab[textgen.META_TOKEN]))
+
+   lock = threading.Lock()
+   def one_at_a_time():
+      with lock:
+         textgenrnn_generate_batch(textgen.get_predictor(), textgen.vocab, textgen.indices_char, 1, 0.5,
+                                   textgen.config['max_length'], textgen.META_TOKEN,
+                                   max_gen_length=max_gen_length, prefix=PREFIX, sampler=sampler)
+
+   scheduler = textgenrnn_scheduler(textgen, sampler=sampler)
+   def scheduled():
+      scheduler.generate(1, 0.5, max_gen_length, PREFIX)
+
+   # traces the predictor
+   scheduled()
+   for concurrency in CONCURRENCY:
+      report("one at a time", one_at_a_time, concurrency)
+      report("scheduler", scheduled, concurrency)
+   scheduler.close()
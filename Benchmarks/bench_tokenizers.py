@@ -0,0 +1,77 @@
+"""
+Decoding and encoding speed (tokens/sec) of the board tokenizers over the whole data/textgenrnn_dataset corpus.
+
+The corpus is in the compact encoding; the boards are decoded once and re-encoded with the
+TreeBoardTokenizer, so both tokenizers decode the same boards.
+A synthetic large board (thousands of wires and polygon vertices) is decoded too.
+"""
+import os, sys, glob, time, io
+import lxml.etree as etree
+
+this_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(this_dir, ".."))
+from BoardTokenize.CompactBoardTokenizer import CompactBoardTokenizer
+from BoardTokenize.TreeBoardTokenizer import TreeBoardTokenizer
+from BoardOperations.constants import *
+
+NUM_RUNS = 3
+# size of the synthetic large board
+NUM_WIRES = 5000
+NUM_POLYGONS = 20
+NUM_VERTICES = 500
+
+def read_corpus():
+   dataset_folder = os.path.join(this_dir, "..", "data", "textgenrnn_dataset")
+   token_strings = []
+   for file_name in sorted(glob.glob(os.path.join(dataset_folder, "*.txt"))):
+      with open(file_name, 'r', encoding='utf-8') as f:
+         token_strings.extend(line for line in f.read().split('\n') if line.strip())
+   return token_strings
+
+def make_large_board():
+   '''Returns a condensed board with NUM_WIRES wires and NUM_POLYGONS polygons of NUM_VERTICES vertices'''
+   root = etree.Element(EAGLE)
+   board = etree.SubElement(etree.SubElement(root, DRAWING), BOARD)
+   plain = etree.SubElement(board, PLAIN)
+   for i in range(NUM_WIRES):
+      etree.SubElement(plain, WIRE, {X1: str(i), Y1: '0.0', X2: str(i), Y2: '10.0', WIDTH: '0.254', LAYER: '20'})
+   for i in range(NUM_POLYGONS):
+      polygon = etree.SubElement(plain, POLYGON, {WIDTH: '0.254', LAYER: '1'})
+      for j in range(NUM_VERTICES):
+         etree.SubElement(polygon, VERTEX, {X: str(i), Y: str(j)})
+   etree.SubElement(board, SIGNALS)
+   return root
+
+def best_time(function, items):
+   '''Returns the best time to call function on all the items, over NUM_RUNS runs'''
+   best = None
+   for _ in range(NUM_RUNS):
+      start = time.perf_counter()
+      for item in items:
+         function(item)
+      elapsed = time.perf_counter() - start
+      best = elapsed if best is None else min(best, elapsed)
+   return best
+
+def report(name, tokenizer, token_strings):
+   num_tokens = sum(len(s.split(tokenizer._WORD_SEPARATOR)) for s in token_strings)
+   decode_speed = num_tokens / best_time(tokenizer.TokenStringToBoard, token_strings)
+   # boards are encoded into a single sink, like when writing a .tokens file
+   boards = [tokenizer.TokenStringToBoard(s) for s in token_strings]
+   sink = io.StringIO()
+   encode_speed = num_tokens / best_time(lambda board: tokenizer.WriteBoardTokens(board, sink), boards)
+   print(f"{name:24} {len(token_strings):5} boards {num_tokens:9} tokens "
+         f"decode: {decode_speed:9.0f} tokens/sec   encode: {encode_speed:9.0f} tokens/sec")
+
+if __name__ == "__main__":
+   compact_strings = read_corpus()
+   compact = CompactBoardTokenizer()
+   report("CompactBoardTokenizer", compact, compact_strings)
+
+   tree = TreeBoardTokenizer()
+   tree_strings = [tree.BoardToTokenString(compact.TokenStringToBoard(s)) for s in compact_strings]
+   report("TreeBoardTokenizer", tree, tree_strings)
+
+   large_board = make_large_board()
+   report("Compact, large board", compact, [compact.BoardToTokenString(large_board)])
+   report("Tree, large board", tree, [tree.BoardToTokenString(large_board)])
@@ -0,0 +1,405 @@
+import lxml.etree as etree
+import sys, copy
+import numpy as np
+from pathlib import Path
+file = Path(__file__).resolve()
+parent, root = file.parent, file.parents[1]
+sys.path.append(str(root))
+from BoardOperations.constants import *
+from BoardOperations import geometry
+
+# attributes kept as float64 columns, per element tag. All the others are kept as strings
+NUMERIC_ATTRIBUTES = {
+   WIRE: [X1, Y1, X2, Y2, WIDTH, LAYER],
+   RECTANGLE: [X1, Y1, X2, Y2, LAYER],
+   CIRCLE: [X, Y, RADIUS, WIDTH, LAYER],
+   HOLE: [X, Y, DRILL],
+   VIA: [X, Y, DRILL],
+   POLYGON: [WIDTH, ISOLATE, SPACING, LAYER],
+   VERTEX: [X, Y]
+}
+# numeric attributes written as integers
+INTEGER_ATTRIBUTES = {LAYER}
+
+# sizes scaled along with the coordinates (see scale.scale_elements)
+SIZE_ATTRIBUTES = {
+   WIRE: [WIDTH],
+   POLYGON: [WIDTH, ISOLATE, SPACING],
+   CIRCLE: [RADIUS, WIDTH],
+   HOLE: [DRILL],
+   VIA: [DRILL]
+}
+
+# layer -> mirrored layer, as a lookup array
+_MIRROR_TABLE = np.arange(256, dtype=np.float64)
+for _layer, _opposite_layer in MIRROR_LAYERS.items():
+   _MIRROR_TABLE[_layer] = _opposite_layer
+
+class ElementArrays:
+   '''Struct-of-arrays of all the elements with the same tag (e.g. all the wires of a board).
+
+   Numeric attributes (coordinates, sizes, layer) are float64 columns, NaN when an element does not
+   have the attribute. Their original strings are kept until the column is modified, so untouched
+   values are written back unchanged. Modified values are rounded to ROUNDING_PRECISION only when
+   written. The other attributes (style, pour, ...) are kept as per-element dicts of strings and are
+   never modified, so they are shared between copies.
+
+   parent is the index of the container of each element (see BoardModel), or of its polygon for
+   vertices. order is the position of each element in its container.'''
+   __slots__ = ('tag', 'columns', 'strings', 'text', 'keys', 'parent', 'order')
+
+   def __init__(self, tag):
+      self.tag = tag
+      self.columns = {attr: np.zeros(0) for attr in NUMERIC_ATTRIBUTES[tag]}
+      # original strings of each numeric column, None once the column has been modified
+      self.strings = {attr: [] for attr in NUMERIC_ATTRIBUTES[tag]}
+      self.text = []
+      # attribute names of each element, in their original order
+      self.keys = []
+      self.parent = np.zeros(0, dtype=np.int64)
+      self.order = np.zeros(0, dtype=np.int64)
+
+   def __len__(self):
+      return len(self.parent)
+
+   @classmethod
+   def from_elements(cls, tag, elements, parents, orders):
+      '''Reads the attributes of lxml elements (all with the same tag) into arrays'''
+      arrays = cls(tag)
+      numeric = NUMERIC_ATTRIBUTES[tag]
+      strings = {attr: [None]*len(elements) for attr in numeric}
+      for i, element in enumerate(elements):
+         text = {}
+         for attr, value in element.attrib.items():
+            column = strings.get(attr)
+            if column is not None:
+               column[i] = value
+            else:
+               text[attr] = value
+         arrays.text.append(text)
+         arrays.keys.append(tuple(element.attrib.keys()))
+
+      for attr in numeric:
+         arrays.columns[attr] = np.array([np.nan if value is None else float(value) for value in strings[attr]],
+            dtype=np.float64)
+      arrays.strings = strings
+      arrays.parent = np.array(parents, dtype=np.int64)
+      arrays.order = np.array(orders, dtype=np.int64)
+      return arrays
+
+   def copy(self):
+      '''Returns a copy, sharing only the (never modified) string attributes'''
+      arrays = ElementArrays(self.tag)
+      arrays.columns = {attr: column.copy() for attr, column in self.columns.items()}
+      arrays.strings = {attr: None if column is None else list(column) for attr, column in self.strings.items()}
+      arrays.text = list(self.text)
+      arrays.keys = list(self.keys)
+      arrays.parent = self.parent.copy()
+      arrays.order = self.order.copy()
+      return arrays
+
+   def set_column(self, attr, values):
+      '''Replaces the values of a numeric column (its original strings are dropped)'''
+      self.columns[attr] = values
+      self.strings[attr] = None
+
+   def get_attributes(self):
+      '''Returns the attributes of every element as an (ordered) dict of strings'''
+      formatted = {attr: self.__format_column(attr) for attr in self.columns}
+      return [{attr: text[attr] if attr in text else formatted[attr][i] for attr in keys}
+         for i, (keys, text) in enumerate(zip(self.keys, self.text))]
+
+   def __format_column(self, attr):
+      '''Returns the strings of a numeric column: the original ones if kept, otherwise the rounded values'''
+      strings = self.strings[attr]
+      if strings is not None and None not in strings:
+         return strings
+      # NaN (v != v) is a missing attribute, never written
+      if attr in INTEGER_ATTRIBUTES:
+         values = [str(int(v)) if v == v else None for v in self.columns[attr].tolist()]
+      else:
+         values = [str(round(v, ROUNDING_PRECISION)) if v == v else None for v in self.columns[attr].tolist()]
+      if strings is None:
+         return values
+      return [value if string is None else string for string, value in zip(strings, values)]
+
+   def tile(self, n):
+      '''Returns n copies of the elements, one after the other'''
+      arrays = ElementArrays(self.tag)
+      arrays.columns = {attr: np.tile(column, n) for attr, column in self.columns.items()}
+      arrays.strings = {attr: None if column is None else column*n for attr, column in self.strings.items()}
+      arrays.text = self.text*n
+      arrays.keys = self.keys*n
+      arrays.parent = np.tile(self.parent, n)
+      arrays.order = np.tile(self.order, n)
+      return arrays
+
+   @staticmethod
+   def concatenate(tag, parts):
+      '''Concatenates a list of (arrays, new parents) into a single ElementArrays'''
+      arrays = ElementArrays(tag)
+      for attr in arrays.columns:
+         arrays.columns[attr] = np.concatenate([part.columns[attr] for part, _ in parts])
+         if all(part.strings[attr] is None for part, _ in parts):
+            arrays.strings[attr] = None
+         else:
+            strings = []
+            for part, _ in parts:
+               strings.extend([None]*len(part) if part.strings[attr] is None else part.strings[attr])
+            arrays.strings[attr] = strings
+      for part, _ in parts:
+         arrays.text.extend(part.text)
+         arrays.keys.extend(part.keys)
+      arrays.parent = np.concatenate([parents for _, parents in parts])
+      arrays.order = np.concatenate([part.order for part, _ in parts])
+      return arrays
+
+def mirror_layers(layers):
+   '''Returns the mirrored layers of a layer column (NaN, no layer, is kept)'''
+   known = ~np.isnan(layers) & (layers >= 0) & (layers < len(_MIRROR_TABLE))
+   mirrored = layers.copy()
+   mirrored[known] = _MIRROR_TABLE[layers[known].astype(np.int64)]
+   return mirrored
+
+class BoardModel:
+   '''Array-backed model of the \<plain> and \<signals> elements of a board (or of a package).
+
+   The board elements are kept as one ElementArrays per tag, so transformations are applied to whole
+   columns at once, without re-parsing or formatting attributes. Boards are converted from/to lxml only
+   when read and written (see brdFile.read_board_model / write_board_model).
+
+   containers holds the (tag, attributes) of the parents of the elements: \<plain> first, then each
+   \<signal>. Other children of the containers (text, contactref, ...) are kept as lxml elements.'''
+   __slots__ = ('containers', 'arrays', 'others')
+
+   def __init__(self):
+      self.containers = [(PLAIN, {})]
+      self.arrays = {tag: ElementArrays(tag) for tag in NUMERIC_ATTRIBUTES}
+      # (container index, order, lxml element) of the elements that are not modelled
+      self.others = []
+
+   def __len__(self):
+      '''Number of elements (vertices not included)'''
+      return sum(len(arrays) for tag, arrays in self.arrays.items() if tag != VERTEX) + len(self.others)
+
+   @classmethod
+   def from_board(cls, root):
+      '''Reads the \<plain> and \<signals> elements of a board'''
+      model = cls()
+      children = []
+      plains = root.findall('.//drawing/board/plain')
+      if len(plains) > 0:
+         model.containers[0] = (PLAIN, dict(plains[0].attrib))
+         children.append((0, plains[0]))
+      signals = root.findall('.//drawing/board/signals')
+      if len(signals) > 0:
+         for signal in signals[0].iterchildren(SIGNAL):
+            children.append((len(model.containers), signal))
+            model.containers.append((SIGNAL, dict(signal.attrib)))
+      model.__read_children(children)
+      return model
+
+   @classmethod
+   def from_elements(cls, elements, container=(PLAIN, {})):
+      '''Reads a list of elements (e.g. the elements of a package), all in the same container'''
+      model = cls()
+      model.containers = [container]
+      model.__read_children([(0, elements)])
+      return model
+
+   def __read_children(self, children):
+      elements = {tag: [] for tag in NUMERIC_ATTRIBUTES}
+      parents = {tag: [] for tag in NUMERIC_ATTRIBUTES}
+      orders = {tag: [] for tag in NUMERIC_ATTRIBUTES}
+
+      for container_index, container in children:
+         for order, element in enumerate(container):
+            if element.tag not in elements or element.tag == VERTEX:
+               self.others.append((container_index, order, element))
+               continue
+            if element.tag == POLYGON:
+               polygon_index = len(elements[POLYGON])
+               for vertex_order, vertex in enumerate(element.iterchildren(VERTEX)):
+                  elements[VERTEX].append(vertex)
+                  parents[VERTEX].append(polygon_index)
+                  orders[VERTEX].append(vertex_order)
+            elements[element.tag].append(element)
+            parents[element.tag].append(container_index)
+            orders[element.tag].append(order)
+
+      for tag in NUMERIC_ATTRIBUTES:
+         self.arrays[tag] = ElementArrays.from_elements(tag, elements[tag], parents[tag], orders[tag])
+
+   def get_max_order(self):
+      '''Returns the largest position of an element in its container (-1 if the model is empty)'''
+      orders = [int(arrays.order.max()) for tag, arrays in self.arrays.items() if tag != VERTEX and len(arrays)]
+      orders.extend(order for _, order, _ in self.others)
+      return max(orders, default=-1)
+
+   def copy(self):
+      model = BoardModel()
+      model.containers = list(self.containers)
+      model.arrays = {tag: arrays.copy() for tag, arrays in self.arrays.items()}
+      model.others = list(self.others)
+      return model
+
+   def transform(self, rot=None, offset=(0,0), factor=1.0, origin=(0,0)):
+      '''Applies p' = factor * R * (p - origin) + origin + offset to all coordinates (see
+      geometry.transform_elements). Mirrored rotations also move the elements to their mirror layers.
+      Only coordinates are changed, not sizes (see scale)'''
+      cos, sin = geometry.rotation_cos_sin(rot) if rot is not None else (1, 0)
+      a, b, c, d = factor*cos, -factor*sin, factor*sin, factor*cos
+      ox, oy = origin
+      tx, ty = ox + offset[0], oy + offset[1]
+
+      for tag, arrays in self.arrays.items():
+         for x_attr, y_attr in geometry.POINT_ATTRIBUTES.get(tag, []):
+            dx = arrays.columns[x_attr] - ox
+            dy = arrays.columns[y_attr] - oy
+            arrays.set_column(x_attr, a*dx + b*dy + tx)
+            arrays.set_column(y_attr, c*dx + d*dy + ty)
+
+         if rot is not None and rot.mirror is True and LAYER in arrays.columns:
+            mirrored = mirror_layers(arrays.columns[LAYER])
+            if not np.array_equal(mirrored, arrays.columns[LAYER], equal_nan=True):
+               arrays.set_column(LAYER, mirrored)
+
+      return self
+
+   def scale(self, factor):
+      '''Scales coordinates and sizes by 'factor', like scale.scale_elements'''
+      self.transform(factor=factor)
+
+      for tag, size_attributes in SIZE_ATTRIBUTES.items():
+         arrays = self.arrays[tag]
+         if len(arrays) == 0:
+            continue
+         for attr in size_attributes:
+            values = arrays.columns[attr]
+            if tag == WIRE and attr == WIDTH:
+               # the width of dimension wires is not scaled
+               scaled = np.where(arrays.columns[LAYER] == 20, values, values*factor)
+            elif tag == POLYGON and attr == SPACING:
+               # the spacing only matters (and is scaled) for hatched polygons
+               hatch = np.array([text.get(POUR) == 'hatch' for text in arrays.text])
+               for i in np.flatnonzero(hatch & np.isnan(values)):
+                  arrays.keys[i] = arrays.keys[i] + (SPACING,)
+               values = np.where(hatch & np.isnan(values), 1.27, values)
+               scaled = np.where(hatch, values*factor, values)
+            else:
+               scaled = values*factor
+            arrays.set_column(attr, scaled)
+
+      return self
+
+   def place(self, rotations, offsets, containers, order_offsets):
+      '''Returns len(rotations) copies of the model (e.g. of a package placed several times on a board),
+      copy k rotated by rotations[k] around (0,0) then moved by offsets[k], in one vectorized transform.
+      The elements of copy k go to containers[k], an index in the containers of the model the copies will
+      be added to (see extend), with their orders offset by order_offsets[k]'''
+      n = len(rotations)
+      cos_sin = np.array([geometry.rotation_cos_sin(rot) for rot in rotations], dtype=np.float64).reshape(-1, 2)
+      a, b, c, d = cos_sin[:,0:1], -cos_sin[:,1:2], cos_sin[:,1:2], cos_sin[:,0:1]
+      offsets = np.array(offsets, dtype=np.float64).reshape(-1, 2)
+      tx, ty = offsets[:,0:1], offsets[:,1:2]
+      mirrored = np.array([rot.mirror is True for rot in rotations])
+      containers = np.array(containers, dtype=np.int64)
+      order_offsets = np.array(order_offsets, dtype=np.int64)
+
+      placed = BoardModel()
+      placed.containers = []
+      num_polygons = len(self.arrays[POLYGON])
+      for tag, arrays in self.arrays.items():
+         tiled = arrays.tile(n)
+         m = len(arrays)
+         # copy k is the row k of the (n, m) views of the columns
+         for x_attr, y_attr in geometry.POINT_ATTRIBUTES.get(tag, []):
+            dx = arrays.columns[x_attr] - 0.0
+            dy = arrays.columns[y_attr] - 0.0
+            tiled.set_column(x_attr, (a*dx + b*dy + tx).ravel())
+            tiled.set_column(y_attr, (c*dx + d*dy + ty).ravel())
+
+         if LAYER in arrays.columns and mirrored.any():
+            layers = tiled.columns[LAYER].reshape(n, m)
+            layers = np.where(mirrored[:,None], mirror_layers(layers), layers)
+            if not np.array_equal(layers.ravel(), tiled.columns[LAYER], equal_nan=True):
+               tiled.set_column(LAYER, layers.ravel())
+
+         if tag == VERTEX:
+            tiled.parent = (arrays.parent + num_polygons*np.arange(n)[:,None]).ravel()
+         else:
+            tiled.parent = np.repeat(containers, m)
+            tiled.order = (arrays.order + order_offsets[:,None]).ravel()
+         placed.arrays[tag] = tiled
+
+      for k in range(n):
+         for _, order, element in self.others:
+            placed.others.append((int(containers[k]), order + int(order_offsets[k]), copy.deepcopy(element)))
+      return placed
+
+   def extend(self, models):
+      '''Adds the elements of models (see place) to this model. Their containers must already be indices
+      in the containers of this model, and their orders must not collide with the ones of this model'''
+      models = [self] + models
+      for model in models[1:]:
+         self.others.extend(model.others)
+      polygon_counts = [len(model.arrays[POLYGON]) for model in models]
+
+      for tag in NUMERIC_ATTRIBUTES:
+         if tag == VERTEX:
+            parts = []
+            polygon_offset = 0
+            for model, polygon_count in zip(models, polygon_counts):
+               vertices = model.arrays[VERTEX]
+               parts.append((vertices, vertices.parent + polygon_offset))
+               polygon_offset += polygon_count
+         else:
+            parts = [(model.arrays[tag], model.arrays[tag].parent) for model in models]
+         self.arrays[tag] = ElementArrays.concatenate(tag, parts)
+
+      return self
+
+   def to_elements(self):
+      '''Returns the lxml elements of each container, as a list of lists'''
+      entries = [[] for _ in self.containers]
+      for container_index, order, element in self.others:
+         entries[container_index].append((order, element))
+
+      vertices = self.arrays[VERTEX]
+      polygon_vertices = [[] for _ in range(len(self.arrays[POLYGON]))]
+      vertex_parents = vertices.parent.tolist()
+      vertex_attributes = vertices.get_attributes()
+      for i in np.lexsort((vertices.order, vertices.parent)).tolist():
+         polygon_vertices[vertex_parents[i]].append(etree.Element(VERTEX, vertex_attributes[i]))
+
+      for tag, arrays in self.arrays.items():
+         if tag == VERTEX:
+            continue
+         attributes = arrays.get_attributes()
+         for i, (container_index, order) in enumerate(zip(arrays.parent.tolist(), arrays.order.tolist())):
+            element = etree.Element(tag, attributes[i])
+            if tag == POLYGON:
+               element.extend(polygon_vertices[i])
+            entries[container_index].append((order, element))
+
+      return [[element for _, element in sorted(container_entries, key=lambda entry: entry[0])]
+         for container_entries in entries]
+
+   def to_board(self, root):
+      '''Replaces the \<plain> and \<signals> elements of a board (e.g. an empty template) with the model'''
+      plain = root.findall('.//drawing/board/plain')[0]
+      signals = root.findall('.//drawing/board/signals')[0]
+      for child in list(plain):
+         plain.remove(child)
+      for child in list(signals):
+         signals.remove(child)
+
+      for (tag, attributes), elements in zip(self.containers, self.to_elements()):
+         if tag == PLAIN:
+            plain.attrib.update(attributes)
+            plain.extend(elements)
+         else:
+            signal = etree.SubElement(signals, tag, attributes)
+            signal.extend(elements)
+
+      return root
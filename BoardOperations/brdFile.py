@@ -5,6 +5,14 @@ import copy, os, sys, pathlib
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 from BoardOperations.constants import *
 from BoardOperations import brdFile, flatten, cleanup
+from BoardOperations.boardModel import BoardModel
+
+TEMPLATES_FOLDER = os.path.join(pathlib.Path(__file__).parent.parent.absolute(), 'templates')
+
+# parsed templates (file name -> root) and the <layers> of empty_board.brd, read once per process.
+# They are shared: never modify them, copy them instead
+_templates = {}
+_template_layers = None
 
 def read_board(file_name):
    '''Parses a board from file_name and returns its tree'''
@@ -24,6 +32,35 @@ def write_board(root, output_file):
       f.write(mystr)
       f.flush()
 
+def read_board_model(file_name):
+   '''Parses a board from file_name and returns its root element and the BoardModel of its \<plain> and \<signals>'''
+   root = read_board_root(file_name)
+   return root, BoardModel.from_board(root)
+
+def write_board_model(root, model, output_file):
+   '''Writes a board to the output_file, with its \<plain> and \<signals> replaced by the BoardModel'''
+   model.to_board(root)
+   write_board(root, output_file)
+
+def get_template(template_name):
+   '''Returns the (shared, read-only) root of a board template from the templates folder, parsed only once'''
+   template = _templates.get(template_name)
+   if template is None:
+      template = read_board_root(os.path.join(TEMPLATES_FOLDER, template_name))
+      _templates[template_name] = template
+   return template
+
+def get_template_layers():
+   '''Returns the (shared, read-only) \<layers> element of the empty board template'''
+   global _template_layers
+   if _template_layers is None:
+      template_layers = get_template('empty_board.brd').findall('.//drawing/layers')[0]
+      layers = etree.Element('layers')
+      for layer in template_layers:
+         etree.SubElement(layers, LAYER, dict(layer.attrib))
+      _template_layers = layers
+   return _template_layers
+
 def read_utf8_file_to_string(file_name):
    '''Reads the contents of a file as an UTF-8 string'''
    stringValue = None
@@ -71,32 +108,25 @@ def getEagleBoardFromCondensed(root):
 
    layers = root.findall('.//drawing/layers')
    if len(layers) == 0:
-      layers = etree.SubElement(drawing, 'layers')
-      empty_brd_template = os.path.join(pathlib.Path(__file__).parent.parent.absolute(), 'templates', 'empty_board.brd')
-      empty_board_root = brdFile.read_board_root(empty_brd_template)
-      template_layers = empty_board_root.findall('.//drawing/layers')[0]
-      for layer in template_layers:
-         new_layer = etree.SubElement(layers, LAYER)
-         for attrib in layer.attrib:
-            new_layer.attrib[attrib] = layer.attrib[attrib]
+      drawing.append(copy.deepcopy(get_template_layers()))
 
-   libraries = root.findall('.//drawing/libraries')
+   libraries = root.findall('.//drawing/board/libraries')
    etree.SubElement(board, 'libraries') if len(libraries) == 0 else None
-   elements = root.findall('.//drawing/elements')
+   elements = root.findall('.//drawing/board/elements')
    etree.SubElement(board, 'elements') if len(elements) == 0 else None
 
-def getCondensedBoardFromEagle(root, flatten_board=False):
-   '''Takes a full Eagle board and returns a condensed XML tree suitable for tokenizing'''
+def getCondensedBoardFromEagle(root, flatten_board=False, package_cache=None):
+   '''Takes a full Eagle board and returns a condensed XML tree suitable for tokenizing.
+   package_cache is the PackageCache used when flattening (the process-wide one by default)'''
    # cleanup elements
    cleanup.cleanup_tags(root, PLAIN)
    cleanup.cleanup_tags(root, SIGNAL)
 
    if flatten_board:
-      flatten.flatten_board(root)
+      flatten.flatten_board(root, package_cache)
 
-   # construct the condensed ML-ready board from the empty template
-   empty_ml_file = os.path.join(pathlib.Path(__file__).parent.parent.absolute(), 'templates', 'ml_empty_board.brd')
-   template = brdFile.read_board_root(empty_ml_file)
+   # construct the condensed ML-ready board from the empty template (merging copies it)
+   template = get_template('ml_empty_board.brd')
    root = brdFile.merge_board_into_template(template, root)
 
    return root
\ No newline at end of file
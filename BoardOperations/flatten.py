@@ -3,21 +3,36 @@ from sys import stdout
 import os, math
 import copy
 from BoardOperations.constants import *
-from BoardOperations import move, rotate, create, brdFile, common
+from BoardOperations import move, rotate, create, brdFile, common, geometry
+from BoardOperations.packageCache import PackageCache
+from BoardOperations.boardModel import BoardModel
 from collections import namedtuple
 
-def flatten_board(root):
-   '''Flattens a board by folding all package elements into either the \<plain> or \<signals> elements'''
+# transformed packages, shared by all the boards flattened in this process
+default_package_cache = PackageCache()
+
+def flatten_board(root, package_cache=None):
+   '''Flattens a board by folding all package elements into either the \<plain> or \<signals> elements.
+   Packages are transformed through a PackageCache (by default, one shared by the whole process)'''
+   if package_cache is None:
+      package_cache = default_package_cache
    libraries = get_all_library_packages(root)
 
    # first transform all packages into elements suitable for plain/signals
    for library in libraries:
       library_packages = libraries[library]
       for package in library_packages:
-         filtered_package = filter_child_elements(library_packages[package])
-         transformed_package = transform_package(filtered_package)
+         transformed_package = package_cache.get_transformed_package(library, library_packages[package],
+            filter_and_transform_package)
          library_packages[package] = transformed_package
 
+   # the board's own elements are filtered once, placed packages are already filtered and only appended
+   plains = root.findall('.//drawing/board/plain')[0]
+   filter_child_elements(plains)
+   signals = root.findall('.//drawing/board/signals')[0]
+   for signal in signals:
+      filter_child_elements(signal)
+
    elements = get_all_elements(root) # Eagle elements = package placements
    for package_ref in elements:
       lib_name = package_ref[LIBRARY]
@@ -33,12 +48,83 @@ def flatten_board(root):
 
       # manipulate and place the package definition
       duplicated_package = copy.deepcopy(package_definition)
-      rotated_package = rotate_package(duplicated_package, package_ref[ROTATION])
-      placed_package = place_package(rotated_package, package_ref[X], package_ref[Y])
-      dispatch_elements(root, placed_package, refdes)
+      placed_package = rotate_and_place_package(duplicated_package, package_ref[ROTATION], package_ref[X], package_ref[Y])
+      dispatch_elements(plains, signals, placed_package, refdes)
 
    return root
 
+def flatten_board_model(root, package_cache=None):
+   '''Flattens a board like flatten_board, but into an array-backed BoardModel of its \<plain> and \<signals>.
+   Each transformed package is converted to arrays once, and all its placements are a single vectorized
+   transform of these arrays (no lxml copies, no attribute re-parsing)'''
+   if package_cache is None:
+      package_cache = default_package_cache
+   libraries = get_all_library_packages(root)
+
+   plains = root.findall('.//drawing/board/plain')[0]
+   filter_child_elements(plains)
+   signals = root.findall('.//drawing/board/signals')[0]
+   for signal in signals:
+      filter_child_elements(signal)
+
+   model = BoardModel.from_board(root)
+   elements = get_all_elements(root) # Eagle elements = package placements
+
+   # group the placements by package, all the placements of a package are transformed at once
+   package_models = {}
+   placements = {}
+   for k, package_ref in enumerate(elements):
+      lib_name = package_ref[LIBRARY]
+      package_name = package_ref[PACKAGE]
+
+      key = (lib_name, package_name)
+      if key not in package_models:
+         if lib_name not in libraries:
+            raise Exception("Library {} not defined".format(lib_name))
+         if package_name not in libraries[lib_name]:
+            raise Exception("Package {} referenced in {} not defined".format(package_name, lib_name))
+         package_models[key] = get_package_models(package_cache.get_transformed_package(lib_name,
+            libraries[lib_name][package_name], filter_and_transform_package))
+         placements[key] = []
+      placements[key].append(k)
+
+   # new signals (one per placement with signal elements) are added in placement order
+   signal_containers = {}
+   for k, package_ref in enumerate(elements):
+      _, signal_model = package_models[(package_ref[LIBRARY], package_ref[PACKAGE])]
+      if len(signal_model):
+         signal_containers[k] = len(model.containers)
+         model.containers.append((SIGNAL, {NAME: 'sig_'+package_ref[REFDES]}))
+
+   # the <plain> elements of placement k come after the board's own ones and those of placements 0..k-1
+   first_order = model.get_max_order() + 1
+   order_stride = max([plain_model.get_max_order() + 1 for plain_model, _ in package_models.values()], default=0)
+
+   placed = []
+   for key, indices in placements.items():
+      plain_model, signal_model = package_models[key]
+      rotations = [elements[k][ROTATION] for k in indices]
+      offsets = [(elements[k][X], elements[k][Y]) for k in indices]
+      placed.append(plain_model.place(rotations, offsets, [0]*len(indices),
+         [first_order + k*order_stride for k in indices]))
+      if len(signal_model):
+         placed.append(signal_model.place(rotations, offsets, [signal_containers[k] for k in indices],
+            [0]*len(indices)))
+
+   return model.extend(placed)
+
+def get_package_models(transformed_package):
+   '''Splits a transformed package into the BoardModels of its \<plain> and of its \<signal> elements
+   (see dispatch_elements). Mirroring swaps layers 1 and 16, so the split does not depend on placement'''
+   plain_elements = []
+   signal_elements = []
+   for element in transformed_package:
+      if should_append_element_to_signal(element):
+         signal_elements.append(element)
+      else:
+         plain_elements.append(element)
+   return BoardModel.from_elements(plain_elements), BoardModel.from_elements(signal_elements, (SIGNAL, {}))
+
 def get_all_library_packages(root):
    '''Reads all the libraries and packages in these libraries defined in the board'''
    result = {}
@@ -83,7 +169,8 @@ def filter_child_elements(element):
    '''Filters out child elements from an XML node based on their tags (e.g. \<description>) or layer.'''
    tags_to_skip = [DESCRIPTION, TEXT, DIMENSION, CONTACTREF]
 
-   for child in element:
+   # iterate over a copy, removing a child while iterating would skip the next one
+   for child in list(element):
       # filter by tag
       if (child.tag in tags_to_skip):
          child.getparent().remove(child)
@@ -96,6 +183,11 @@ def filter_child_elements(element):
 
    return element
 
+def filter_and_transform_package(package):
+   '''Filters out the unwanted child elements of a package, then transforms it (see transform_package)'''
+   filtered_package = filter_child_elements(package)
+   return transform_package(filtered_package)
+
 def transform_package(package):
    '''Transforms package elements (e.g. \<smd>, \<pad>) into non-package elements (e.g. \<rectangle>,\<via>,\<hole>)
       Assumes that all unwanted elements have been filtered out (e.g. \<description>,...)
@@ -266,6 +358,11 @@ def place_package(package, x, y):
    move.move_elements(package, x, y)
    return package
 
+def rotate_and_place_package(package, rot, x, y):
+   '''Rotates a package around its (0,0) center and moves it to the x,y location, in a single transform'''
+   geometry.transform_elements(package, rot=rot, offset=(x, y), caller='rotate_and_place_package')
+   return package
+
 def should_append_element_to_signal(element):
    '''Determines whether an element should be part of a \<signal> or of \<plain>''' 
    layer = common.get_element_layer(element)
@@ -278,14 +375,8 @@ def should_append_element_to_signal(element):
 
    return False
 
-def dispatch_elements(root, placed_and_rotated_package, refdes):
-   '''Copies the elements of a placed, rotated, and transformed package into the appropriate \<plain> or \<signals> elements'''
-   plains = root.findall('.//drawing/board/plain')[0]
-   plains = filter_child_elements(plains)
-   signals = root.findall('.//drawing/board/signals')[0]
-   for signal in signals:
-      filter_child_elements(signal)
-
+def dispatch_elements(plains, signals, placed_and_rotated_package, refdes):
+   '''Moves the elements of a placed, rotated, and transformed package into the board's \<plain> or \<signals> elements'''
    new_signal = etree.Element(SIGNAL)
    new_signal.set(NAME, 'sig_'+refdes)
 
@@ -0,0 +1,129 @@
+import lxml.etree as etree
+import sys, math
+import numpy as np
+from pathlib import Path
+file = Path(__file__).resolve()
+parent, root = file.parent, file.parents[1]
+sys.path.append(str(root))
+from BoardOperations.constants import *
+from BoardOperations.common import get_element_layer
+
+# coordinate attributes, as (x,y) pairs, of the elements that can be transformed
+POINT_ATTRIBUTES = {
+   WIRE: [(X1, Y1), (X2, Y2)],
+   RECTANGLE: [(X1, Y1), (X2, Y2)],
+   CIRCLE: [(X, Y)],
+   HOLE: [(X, Y)],
+   VIA: [(X, Y)],
+   VERTEX: [(X, Y)]
+}
+
+# exact (cos, sin) of the orthogonal angles. Almost all Eagle rotations are R0/R90/R180/R270, with or
+# without M, and these need no trigonometry (and none of its rounding noise)
+ORTHOGONAL_ROTATIONS = {
+   0: (1, 0),
+   90: (0, 1),
+   180: (-1, 0),
+   270: (0, -1)
+}
+
+# below this number of points, numpy's overhead is larger than a plain python loop (e.g. transform_smd)
+NUMPY_MIN_POINTS = 16
+
+def transform_elements(elements, rot=None, offset=(0,0), factor=1.0, origin=(0,0), caller='transform_elements'):
+   '''Applies one affine transform to all the coordinates of a list of elements (and polygon vertices):
+   p' = factor * R * (p - origin) + origin + offset, R being the rotation (angle+mirror) matrix.
+   The results are rounded to ROUNDING_PRECISION. Mirrored elements also move to their mirror layer.
+   Only coordinates are changed, not sizes (see scale_attributes).'''
+   refs, values = _collect_coordinates(elements, caller)
+
+   cos, sin = rotation_cos_sin(rot) if rot is not None else (1, 0)
+   a, b, c, d = factor*cos, -factor*sin, factor*sin, factor*cos
+   ox, oy = origin
+   tx, ty = ox + offset[0], oy + offset[1]
+   if len(refs) < NUMPY_MIN_POINTS:
+      points = []
+      for i in range(0, len(values), 2):
+         dx = float(values[i]) - ox
+         dy = float(values[i+1]) - oy
+         points.append((a*dx + b*dy + tx, c*dx + d*dy + ty))
+   else:
+      points = np.array(values, dtype=np.float64).reshape(-1, 2) - (ox, oy)
+      points = points @ np.array([[a, b], [c, d]]).T + (tx, ty)
+   write_points(refs, points)
+
+   if rot is not None and rot.mirror is True:
+      for element in elements:
+         mirror(element)
+
+   return elements
+
+def rotation_matrix(rot):
+   '''Returns the 2x2 matrix of a rotation namedtuple (mirror+angle), CCW, or CW if mirrored (like rotate.rotate)'''
+   cos, sin = rotation_cos_sin(rot)
+   return np.array([[cos, -sin], [sin, cos]], dtype=np.float64)
+
+def rotation_cos_sin(rot):
+   '''Returns the (cos, sin) of a rotation namedtuple, exact for multiples of 90 degrees'''
+   # if the rotation also includes mirroring, rotate CW
+   angle = rot.angle if rot.mirror == False else 360-rot.angle
+   exact = ORTHOGONAL_ROTATIONS.get(angle % 360)
+   if exact is not None:
+      return exact
+   radians = math.radians(angle)
+   return math.cos(radians), math.sin(radians)
+
+def collect_points(elements, caller='collect_points'):
+   '''Returns the (element, x attribute, y attribute) of all the points of a list of elements, and their
+   coordinates as a (N,2) array. Polygons contribute their vertices'''
+   refs, values = _collect_coordinates(elements, caller)
+   return refs, np.array(values, dtype=np.float64).reshape(-1, 2)
+
+def _collect_coordinates(elements, caller):
+   '''Returns the (element, x attribute, y attribute) of all the points of a list of elements, and
+   their unparsed coordinates as a flat x,y,x,y... list'''
+   refs = []
+   values = []
+   for element in elements:
+      if element.tag == POLYGON:
+         children = element.iterchildren(VERTEX)
+      elif element.tag in POINT_ATTRIBUTES:
+         children = [element]
+      else:
+         raise Exception(f"Unhandled element in '{caller}'", etree.tostring(element, encoding='unicode'))
+
+      for child in children:
+         for x_attr, y_attr in POINT_ATTRIBUTES[child.tag]:
+            x = child.get(x_attr)
+            y = child.get(y_attr)
+            if x is None or y is None:
+               continue
+            refs.append((child, x_attr, y_attr))
+            values.append(x)
+            values.append(y)
+
+   return refs, values
+
+def write_points(refs, points):
+   '''Writes rounded coordinates (a (N,2) array or a list of (x,y)) back to the attributes they were collected from'''
+   if isinstance(points, np.ndarray):
+      points = points.tolist()
+   # python's round, unlike np.round, is exact on the decimal ties and matches the values stored so far
+   for (element, x_attr, y_attr), (x, y) in zip(refs, points):
+      element.set(x_attr, str(round(x, ROUNDING_PRECISION)))
+      element.set(y_attr, str(round(y, ROUNDING_PRECISION)))
+
+def scale_attributes(refs, factor):
+   '''Multiplies a list of (element, attribute) values by factor, rounded to ROUNDING_PRECISION'''
+   if len(refs) == 0:
+      return
+   values = np.array([element.get(attribute) for element, attribute in refs], dtype=np.float64)
+   for (element, attribute), value in zip(refs, (values * factor).tolist()):
+      element.set(attribute, str(round(value, ROUNDING_PRECISION)))
+
+def mirror(element):
+   '''Mirrors a board element'''
+   layer = get_element_layer(element)
+   if (layer in MIRROR_LAYERS):
+      opposite_layer = MIRROR_LAYERS[layer]
+      element.set(LAYER, str(opposite_layer))
@@ -0,0 +1,103 @@
+import lxml.etree as etree
+import sys, os, hashlib, tempfile, threading
+from pathlib import Path
+from collections import OrderedDict
+file = Path(__file__).resolve()
+parent, root = file.parent, file.parents[1]
+sys.path.append(str(root))
+from BoardOperations.constants import *
+
+# change when the package transformation changes, so stale on-disk entries are not used
+CACHE_VERSION = '2'
+
+class PackageCache:
+   '''Content-addressed cache of transformed packages (see flatten.transform_package).
+
+   Entries are keyed on the library name, the package name and a hash of the package XML (and of
+   the settings the transformation depends on), so the same package coming from different boards
+   is transformed only once. The most recently used max_entries packages are kept in memory.
+   When a cache_folder is given, packages are also stored there (one file per key) and shared
+   with other processes; files are written atomically, so concurrent writers are safe.
+   A cache can be shared between threads; two threads missing the same package may both
+   transform it.
+
+   The cached packages are shared: callers must copy them before modifying them.'''
+
+   def __init__(self, max_entries=4096, cache_folder=None):
+      self.max_entries = max_entries
+      self.cache_folder = cache_folder
+      if cache_folder is not None:
+         os.makedirs(cache_folder, exist_ok=True)
+      self.__entries = OrderedDict()
+      # guards the entries and the counters, transform() and the disk are used outside of it
+      self.__lock = threading.Lock()
+      self.hits = 0
+      self.disk_hits = 0
+      self.misses = 0
+
+   def get_transformed_package(self, library_name, package, transform):
+      '''Returns the transformed package, calling transform(package) only if it was not cached'''
+      key = self.get_key(library_name, package)
+
+      with self.__lock:
+         transformed_package = self.__entries.get(key)
+         if transformed_package is not None:
+            self.__entries.move_to_end(key)
+            self.hits += 1
+            return transformed_package
+
+      transformed_package = self.__read_from_disk(key)
+      from_disk = transformed_package is not None
+      if not from_disk:
+         transformed_package = transform(package)
+         self.__write_to_disk(key, transformed_package)
+
+      with self.__lock:
+         if from_disk:
+            self.disk_hits += 1
+         else:
+            self.misses += 1
+         self.__entries[key] = transformed_package
+         self.__entries.move_to_end(key)
+         if len(self.__entries) > self.max_entries:
+            self.__entries.popitem(last=False)
+      return transformed_package
+
+   def get_key(self, library_name, package):
+      '''Returns the cache key (a hex digest) of a package from a library'''
+      digest = hashlib.sha1()
+      for part in [CACHE_VERSION, repr(sorted(LAYERS_TO_KEEP)), library_name, package.attrib.get(NAME, '')]:
+         digest.update(part.encode('utf-8'))
+         digest.update(b'\0')
+      digest.update(etree.tostring(package, method='c14n'))
+      return digest.hexdigest()
+
+   def clear(self):
+      '''Empties the in-memory cache (the on-disk store is kept)'''
+      with self.__lock:
+         self.__entries.clear()
+
+   def __len__(self):
+      with self.__lock:
+         return len(self.__entries)
+
+   def __get_file_name(self, key):
+      return os.path.join(self.cache_folder, key + '.xml')
+
+   def __read_from_disk(self, key):
+      if self.cache_folder is None:
+         return None
+      file_name = self.__get_file_name(key)
+      if not os.path.exists(file_name):
+         return None
+      parser = etree.XMLParser(remove_blank_text=True)
+      return etree.parse(file_name, parser=parser).getroot()
+
+   def __write_to_disk(self, key, transformed_package):
+      if self.cache_folder is None:
+         return
+      # write to a temporary file first, other processes only ever see complete files
+      fd, temp_file_name = tempfile.mkstemp(dir=self.cache_folder, suffix='.tmp')
+      with os.fdopen(fd, 'wb') as f:
+         f.write(etree.tostring(transformed_package))
+      os.replace(temp_file_name, self.__get_file_name(key))
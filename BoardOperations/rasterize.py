@@ -0,0 +1,115 @@
+import sys, os, shutil, subprocess, threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+file = Path(__file__).resolve()
+parent, root = file.parent, file.parents[1]
+sys.path.append(str(root))
+
+# width (pixels) of the rasterized boards, the height follows the aspect ratio of the SVG
+DEFAULT_WIDTH = 1000
+# density (dpi) ImageMagick renders the SVG at, before scaling it down to the output width
+IMAGEMAGICK_DENSITY = 400
+# the ImageMagick executable: IMAGEMAGICK_CONVERT if set, else whatever is on the PATH
+IMAGEMAGICK_EXECUTABLE = os.environ.get('IMAGEMAGICK_CONVERT') or shutil.which('magick') or shutil.which('convert') \
+   or r"C:\Program Files\ImageMagick-7.1.0-Q16-HDRI\convert.exe"
+# the backend used when none is given, see get_rasterizer
+DEFAULT_RASTERIZER = os.environ.get('RASTERIZER', 'cairo')
+
+class Rasterizer:
+   '''Converts SVG documents into PNG images, both as bytes in memory.
+   Backends override rasterize, and close if they hold on to resources'''
+
+   def __init__(self, width=DEFAULT_WIDTH):
+      self.width = width
+
+   def rasterize(self, svg_bytes):
+      '''Returns the PNG (bytes) of an SVG document (bytes)'''
+      raise NotImplementedError
+
+   def close(self):
+      pass
+
+   def __enter__(self):
+      return self
+
+   def __exit__(self, *args):
+      self.close()
+
+class CairoRasterizer(Rasterizer):
+   '''Rasterizes in the calling process with cairosvg: no process startup and no temporary file'''
+
+   def __init__(self, width=DEFAULT_WIDTH):
+      super().__init__(width)
+      # imported here, cairosvg needs the native cairo library which the other backends do not
+      import cairosvg
+      self.cairosvg = cairosvg
+
+   def rasterize(self, svg_bytes):
+      return self.cairosvg.svg2png(bytestring=svg_bytes, output_width=self.width)
+
+class ImageMagickRasterizer(Rasterizer):
+   '''Rasterizes with one ImageMagick process per image (the original backend), through pipes'''
+
+   def __init__(self, width=DEFAULT_WIDTH, executable=IMAGEMAGICK_EXECUTABLE, density=IMAGEMAGICK_DENSITY):
+      super().__init__(width)
+      self.executable = executable
+      self.density = density
+
+   def rasterize(self, svg_bytes):
+      cmd = [self.executable, '-density', str(self.density), 'svg:-', '-scale', str(self.width), 'png:-']
+      result = subprocess.run(cmd, input=svg_bytes, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+      if result.returncode != 0:
+         raise Exception(f"ImageMagick failed ({result.returncode}): {result.stderr.decode('utf-8', 'replace').strip()}")
+      return result.stdout
+
+# backend of a worker process of PoolRasterizer, set once by _init_worker
+_worker_rasterizer = None
+
+def _init_worker(backend_name, width):
+   global _worker_rasterizer
+   _worker_rasterizer = RASTERIZERS[backend_name](width)
+
+def _rasterize_task(svg_bytes):
+   return _worker_rasterizer.rasterize(svg_bytes)
+
+class PoolRasterizer(Rasterizer):
+   '''Rasterizes in a pool of worker processes, started once and kept warm (backend already imported).
+   Keeps the memory used by rasterization out of the calling process, and lets several threads of
+   a server rasterize at the same time'''
+
+   def __init__(self, width=DEFAULT_WIDTH, workers=2, backend_name='cairo'):
+      super().__init__(width)
+      self.executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+         initargs=(backend_name, width))
+      # start all the workers now, not on the first requests
+      for future in [self.executor.submit(os.getpid) for _ in range(workers)]:
+         future.result()
+
+   def rasterize(self, svg_bytes):
+      return self.executor.submit(_rasterize_task, svg_bytes).result()
+
+   def close(self):
+      self.executor.shutdown()
+
+RASTERIZERS = {
+   'cairo': CairoRasterizer,
+   'imagemagick': ImageMagickRasterizer,
+   'pool': PoolRasterizer
+}
+
+# rasterizer of the process, created by the first get_rasterizer call
+_default_rasterizer = None
+_default_rasterizer_lock = threading.Lock()
+
+def get_rasterizer(name=None):
+   '''Returns the rasterizer of the process (DEFAULT_RASTERIZER, e.g. from the RASTERIZER environment
+   variable), or a new one when a backend name is given'''
+   global _default_rasterizer
+   if name is not None:
+      if name not in RASTERIZERS:
+         raise Exception(f"Unknown rasterizer {name}, expected one of {list(RASTERIZERS)}")
+      return RASTERIZERS[name]()
+   with _default_rasterizer_lock:
+      if _default_rasterizer is None:
+         _default_rasterizer = get_rasterizer(DEFAULT_RASTERIZER)
+   return _default_rasterizer
@@ -1,12 +1,9 @@
-import os, sys, uuid
-import io
+import os, sys
 import lxml.etree as etree
-import cairosvg
-import subprocess
 
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 from BoardOperations.constants import *
-from BoardOperations import brdFile
+from BoardOperations import brdFile, rasterize
 
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 from eagle2svg.eagle_parser import Eagle
@@ -18,45 +15,32 @@ def convertCondensedBoardToSvgString(root):
    return convertEagleBoardToSvgString(root)   
 
 def convertEagleBoardToSvgString(root):
-   '''Converts a full Eagle board XML object into an SVG string'''
-   tempFolder = os.environ['TEMP']
-   fileName = os.path.join(tempFolder, str(uuid.uuid4())+".brd")
-
-   brdFile.write_board(root, fileName)
-
-   svgString = convertBrdFileToSvgString(fileName)
-
-   os.remove(fileName)
-   return svgString
+   '''Converts a full Eagle board XML object into an SVG string (in memory, safe to call from several threads)'''
+   eagleData = Eagle(root)
+   return renderEagleToSvgString(eagleData)
 
 def convertBrdFileToSvgString(file_name):
    '''Converts an Eagle board file into an SVG string'''
    eagleData = Eagle(file_name)
+   return renderEagleToSvgString(eagleData)
+
+def renderEagleToSvgString(eagleData):
+   '''Renders the layers of interest of a parsed Eagle board into an SVG string'''
    sheet = 0
    layers = {x:True for x in LAYERS_TO_KEEP}
+   return eagleData.render_to_string(sheet, layers)
 
-   old_stdout = sys.stdout
-   sys.stdout = mystdout = io.StringIO()
-
-   eagleData.render(sheet,layers)
-
-   sys.stdout = old_stdout
-
-   svgString = mystdout.getvalue()
-   return svgString
+def convertSvgStringToPngBytes(svgString, rasterizer=None):
+   '''Converts an SVG (string representation) into a PNG, in memory (see rasterize.get_rasterizer)'''
+   if rasterizer is None:
+      rasterizer = rasterize.get_rasterizer()
+   return rasterizer.rasterize(svgString.encode('utf-8'))
 
-def convertSvgStringToPng(svgString, output_png, use_cairo=False):
+def convertSvgStringToPng(svgString, output_png, rasterizer=None):
    '''Converts an SVG (string representation) into a PNG file'''
-   if use_cairo:
-      #stringArray = array.array('B', svgString)
-      cairosvg.svg2png(bytestring=svgString, write_to=output_png, scale=3)
-   else:   #imagemagick
-      temp_svg_file = os.path.splitext(output_png)[0] + ".svg"
-      with open(temp_svg_file, 'w') as f:
-         f.write(svgString)
-      cmd = f'"C:\Program Files\ImageMagick-7.1.0-Q16-HDRI\convert.exe" -density 400 {temp_svg_file} -scale 1000 {output_png}'
-      subprocess.call(cmd, shell=False)
-      os.remove(temp_svg_file)
+   pngBytes = convertSvgStringToPngBytes(svgString, rasterizer)
+   with open(output_png, 'wb') as f:
+      f.write(pngBytes)
 
 if __name__ == "__main__":
    CWD_FOLDER = os.path.dirname(__file__)
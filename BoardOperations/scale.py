@@ -5,68 +5,33 @@ file = Path(__file__).resolve()
 parent, root = file.parent, file.parents[1]
 sys.path.append(str(root))
 from BoardOperations.constants import *
+from BoardOperations import geometry
 
 def scale_elements(elements, factor):
    ''' Scales a list of elements by 'factor'. Assumes the board has been aligned to origin (0,0) '''
+   geometry.transform_elements(elements, factor=factor, caller='ScaleElements')
+   geometry.scale_attributes(get_size_attributes(elements), factor)
+
+def get_size_attributes(elements):
+   '''Returns the (element, attribute) pairs of the sizes (widths, drills, ...) scaled with the elements'''
+   sizes = []
    for element in elements:
       if (element.tag == WIRE):
-         scale_wire(element, factor)
+         if (element.attrib[LAYER] != '20'):
+            sizes.append((element, WIDTH))
       elif (element.tag == POLYGON):
-         scale_polygon(element, factor)
+         sizes.append((element, WIDTH))
+         sizes.append((element, ISOLATE))
+         if (POUR in element.attrib and element.attrib[POUR]=='hatch'):
+            if (SPACING not in element.attrib):
+               element.set(SPACING, "1.27")
+            sizes.append((element, SPACING))
       elif (element.tag == CIRCLE):
-         scale_circle(element, factor)
-      elif (element.tag == RECTANGLE):
-         scale_rectangle(element, factor)
-      elif (element.tag == HOLE):
-         scale_hole(element, factor)
-      elif (element.tag == VIA):
-         scale_via(element, factor)
-      else:
-         raise Exception("Unhandled element in 'ScaleElements'", etree.tostring(element, encoding='unicode'))
-
-def scale_wire(eWire, factor):
-   scale_attribute(eWire, X1, factor)
-   scale_attribute(eWire, Y1, factor)
-   scale_attribute(eWire, X2, factor)
-   scale_attribute(eWire, Y2, factor)
-
-   if (eWire.attrib[LAYER] != '20'):
-      scale_attribute(eWire, WIDTH, factor)
-
-def scale_polygon(ePoly, factor):
-   scale_attribute(ePoly, WIDTH, factor)
-   scale_attribute(ePoly, ISOLATE, factor)
-
-   if (POUR in ePoly.attrib and ePoly.attrib[POUR]=='hatch'):
-      if (SPACING not in ePoly.attrib):
-         ePoly.set(SPACING, "1.27")
-      scale_attribute(ePoly, SPACING, factor)
-
-   for eVertex in ePoly.xpath('vertex'):
-      scale_attribute(eVertex, X, factor)
-      scale_attribute(eVertex, Y, factor)
-
-def scale_circle(eCircle, factor):
-   scale_attribute(eCircle, X, factor)
-   scale_attribute(eCircle, Y, factor)
-   scale_attribute(eCircle, RADIUS, factor)
-   scale_attribute(eCircle, WIDTH, factor)
-
-def scale_rectangle(eRect, factor):
-   scale_attribute(eRect, X1, factor)
-   scale_attribute(eRect, X2, factor)
-   scale_attribute(eRect, Y1, factor)
-   scale_attribute(eRect, Y2, factor)
-
-def scale_hole(eHole, factor):
-   scale_attribute(eHole, X, factor)
-   scale_attribute(eHole, Y, factor)
-   scale_attribute(eHole, DRILL, factor)
-
-def scale_via(eVia, factor):
-   scale_attribute(eVia, X, factor)
-   scale_attribute(eVia, Y, factor)
-   scale_attribute(eVia, DRILL, factor)
+         sizes.append((element, RADIUS))
+         sizes.append((element, WIDTH))
+      elif (element.tag == HOLE or element.tag == VIA):
+         sizes.append((element, DRILL))
+   return [(element, attribute) for element, attribute in sizes if attribute in element.attrib]
 
 def scale_attribute(element, attribute, factor):
    if (attribute in element.attrib):
@@ -85,6 +85,10 @@ class BaseBoardTokenizer:
       'yes': '√'
    }
 
+   # reverse lookups used when decoding, built once per class
+   _TOKENS_TO_ATTRIBUTES = {token: attr for attr, token in _ATTRIBUTES_TO_TOKENS.items()}
+   _TOKENS_TO_ATTRIBUTE_VALUES = {token: value for value, token in _ATTRIBUTE_VALUES_TO_TOKENS.items()}
+
 
    def __init__(self, verbosity=0):
       # so far, do nothing, added just in case
@@ -94,27 +98,44 @@ class BaseBoardTokenizer:
 
    def BoardToTokenString(self, root):
       '''Returns the token string of an entire board'''
-      top_elem = root[0]
-      stringResult = self._TokenizeElement(top_elem) + self._END_OF_BOARD
+      stringResult = self._WORD_SEPARATOR.join(self.IterBoardTokens(root)) + self._END_OF_BOARD
       return stringResult
 
+   def WriteBoardTokens(self, root, sink):
+      '''Writes the token string of an entire board to a sink with a write() method
+      (an opened .tokens file, io.StringIO), one token at a time'''
+      separator = ''
+      for token in self.IterBoardTokens(root):
+         sink.write(separator)
+         sink.write(token)
+         separator = self._WORD_SEPARATOR
+      sink.write(self._END_OF_BOARD)
+
+   def IterBoardTokens(self, root):
+      '''Yields the tokens of an entire board, in a single walk over the tree'''
+      return self._IterElementTokens(root[0])
+
    def _TokenizeElement(self, elem):
+      '''Returns the token string of an element and its children'''
+      return self._WORD_SEPARATOR.join(self._IterElementTokens(elem))
+
+   def _IterElementTokens(self, elem):
       raise NotImplementedError()
 
    def _TokenizeAttributes(self, elem):
       '''Tokenizes all attributes of an element (with defaults, when necessary)'''
+      return self._WORD_SEPARATOR.join(self._IterAttributeTokens(elem))
+
+   def _IterAttributeTokens(self, elem):
+      '''Yields the tokens of all attributes of an element (with defaults, when necessary)'''
       attribute_defaults = self._DEFAULT_ATTRIBUTE_VALUES[elem.tag]
-      attribute_values = []
       for attr in attribute_defaults:
          attrToken = self._ATTRIBUTES_TO_TOKENS[attr]
          value = self.__GetAttributeValueOrDefault(elem,attr)
          if value is None:
             continue
          valueTokens = self._ATTRIBUTE_VALUES_TO_TOKENS.get(value, value)
-         attribute_values.append(attrToken+valueTokens)
-
-      stringResult = self._WORD_SEPARATOR.join(attribute_values)
-      return stringResult
+         yield attrToken+valueTokens
 
    def __GetAttributeValueOrDefault(self, elem, attribute_name):
       '''Returns the value of the attribute or its default value. None is returned when the attribute must be skipped
@@ -123,8 +144,9 @@ class BaseBoardTokenizer:
       if attribute_name in self._ATTRIBUTES_TO_SKIP:
          return None
 
-      if attribute_name in elem.attrib:
-         return elem.attrib[attribute_name]
+      attribute_value = elem.get(attribute_name)
+      if attribute_value is not None:
+         return attribute_value
 
       attribute_defaults = self._DEFAULT_ATTRIBUTE_VALUES[elem.tag]
       attribute_value = attribute_defaults[attribute_name]
@@ -139,15 +161,11 @@ class BaseBoardTokenizer:
 
    def _DecodeAndAddAttributeToken(self, token, elem, idx):
       '''Decodes an attribute token and adds the attribute to the XML element'''
-      tokensToAttributeNames = {v: k for k,v in self._ATTRIBUTES_TO_TOKENS.items()}
-      attributeValuesToValues = {v: k for k,v in self._ATTRIBUTE_VALUES_TO_TOKENS.items()}
-      if token[0] not in tokensToAttributeNames:
+      attributeName = self._TOKENS_TO_ATTRIBUTES.get(token[:1])
+      if attributeName is None:
          raise Exception(f"Unrecognized attribute {token} at index {idx} in element {elem.tag}")
-      attributeName = tokensToAttributeNames[token[0]]
       value = token[1:]
-      if (value in attributeValuesToValues):
-         value = attributeValuesToValues[value]
-      elem.attrib[attributeName] = value
+      elem.set(attributeName, self._TOKENS_TO_ATTRIBUTE_VALUES.get(value, value))
 
    def GenerateTextgenrnnVocab(self):
       vocab = {
@@ -0,0 +1,323 @@
+import sys
+from pathlib import Path
+file = Path(__file__).resolve()
+parent, root = file.parent, file.parents[1]
+sys.path.append(str(root))
+from BoardOperations.constants import *
+import numpy as np
+from BoardTokenize.CompactBoardTokenizer import CompactBoardTokenizer, TranslationPhase
+
+class CompactBoardGrammar:
+   '''Character-level grammar of the CompactBoardTokenizer encoding, used to constrain text generation.
+
+   The grammar is built from the tokenizer tables: the element tags of each phase (_TOP_TAGS,
+   _PLAINS_TAGS, _SIGNALS_TAGS), their nesting levels (_TAGS_TO_LEVELS) and the attributes of each
+   element, in the order the tokenizer writes them (_DEFAULT_ATTRIBUTE_VALUES; attributes without a
+   default are required, the others can be left out).
+   Any string the grammar accepts, ended at a point where can_end() is True, decodes with
+   TokenStringToBoard into a board with <drawing>, <board> and <plain>.
+
+   new_state() returns the parsing state of one text. The masks of legal vocabulary indices are
+   built once per set of legal characters and shared by all the states.'''
+
+   _TOKENIZER = CompactBoardTokenizer
+   # tags that can only be children of one tag
+   _PARENT_TAGS = {VERTEX: POLYGON}
+   # how many children an element needs before it can be closed (curved polygons have only 2 vertices)
+   _MIN_CHILDREN = {POLYGON: 2}
+   # attributes that take one of a few encoded values
+   _ENUM_VALUES = {
+      STYLE: ['continuous', 'longdash', 'shortdash', 'dashdot'],
+      CAP: ['round', 'flat'],
+      SHAPE: ['round', 'square', 'octagon'],
+      POUR: ['solid', 'hatch', 'cutout']
+   }
+   # attributes whose values are not decimal numbers (e.g. layer '16', extent '1-16', rotation 'R90')
+   _VALUE_FORMATS = {
+      LAYER: 'integer',
+      RANK: 'integer',
+      EXTENT: 'range',
+      ROTATION: 'rotation'
+   }
+   # maximum number of digits before/after the decimal point
+   _MAX_DIGITS = 6
+   _DIGITS = set('0123456789')
+
+   def __init__(self, vocab):
+      tk = self._TOKENIZER
+      self.vocab = vocab
+      self.num_classes = max(vocab.values()) + 1
+      self.separator = tk._WORD_SEPARATOR
+      self.end_token = tk._END_OF_BOARD
+      self.levels = tk._TAGS_TO_LEVELS
+      self.phase_tags = {
+         TranslationPhase.Top: tk._TOP_TAGS,
+         TranslationPhase.Plains: tk._PLAINS_TAGS,
+         TranslationPhase.Signals: tk._SIGNALS_TAGS
+      }
+
+      # attributes of each tag, as (attribute token, attribute name, required) in encoding order
+      self.attributes = {}
+      for tag, defaults in tk._DEFAULT_ATTRIBUTE_VALUES.items():
+         self.attributes[tag] = [(tk._ATTRIBUTES_TO_TOKENS[attr], attr, defaults[attr] is None)
+            for attr in defaults if attr not in tk._ATTRIBUTES_TO_SKIP]
+
+      # value format of each attribute
+      self.formats = {}
+      for attr in tk._ATTRIBUTES_TO_TOKENS:
+         if attr in self._ENUM_VALUES:
+            values = {tk._ATTRIBUTE_VALUES_TO_TOKENS[value] for value in self._ENUM_VALUES[attr]}
+            self.formats[attr] = ('enum', values)
+         else:
+            self.formats[attr] = (self._VALUE_FORMATS.get(attr, 'number'), None)
+
+      # legal children of each tag, by the phase of its children, as {token: child tag}
+      self.children = {}
+      for phase in self.phase_tags:
+         for tag in self.levels:
+            self.children[(tag, phase)] = self.__GetChildren(tag, phase)
+
+      self.__masks = {}
+
+   def new_state(self):
+      '''Returns the state of a new, empty, text'''
+      return CompactBoardGrammarState(self)
+
+   def child_phase(self, tag, phase):
+      '''Returns the phase of the children of an element (same rules as the tokenizer)'''
+      if phase is TranslationPhase.Top:
+         if tag == PLAIN:
+            return TranslationPhase.Plains
+         if tag == SIGNALS:
+            return TranslationPhase.Signals
+      return phase
+
+   def mask(self, chars):
+      '''Returns the (cached) boolean mask of the vocabulary indices of a set of characters'''
+      key = frozenset(chars)
+      mask = self.__masks.get(key)
+      if mask is None:
+         mask = np.zeros(self.num_classes, dtype=bool)
+         for char in key:
+            if char in self.vocab:
+               mask[self.vocab[char]] = True
+         self.__masks[key] = mask
+      return mask
+
+   def value_options(self, attr, value):
+      '''Returns the characters that can extend a (partial) attribute value, and whether the value is complete'''
+      kind, values = self.formats[attr]
+      if kind == 'enum':
+         return (values, False) if value == '' else (set(), True)
+      if kind == 'integer':
+         return self.__IntegerOptions(value)
+      if kind == 'rotation':
+         if value == '':
+            return {'R'}, False
+         return self.__IntegerOptions(value[1:])
+      if kind == 'range':
+         if '-' in value:
+            return self.__IntegerOptions(value.split('-')[1])
+         options, complete = self.__IntegerOptions(value)
+         return (options | {'-'}) if complete else options, False
+
+      # signed decimal number
+      body = value[1:] if value.startswith('-') else value
+      if body == '':
+         return (self._DIGITS | {'-'}) if value == '' else self._DIGITS, False
+      if '.' in body:
+         fraction = body.split('.')[1]
+         if fraction == '':
+            return self._DIGITS, False
+         return (self._DIGITS if len(fraction) < self._MAX_DIGITS else set()), True
+      options, complete = self.__IntegerOptions(body)
+      return options | {'.'}, complete
+
+   def __IntegerOptions(self, value):
+      if value == '':
+         return self._DIGITS, False
+      if value == '0' or len(value) >= self._MAX_DIGITS:
+         return set(), True
+      return self._DIGITS, True
+
+   def __GetChildren(self, tag, phase):
+      '''The children of a tag are the tags of the phase with the highest level below the tag's level'''
+      tag_level = self.levels[tag]
+      candidates = {}
+      for child, token in self.phase_tags[phase].items():
+         if self.levels[child] >= tag_level:
+            continue
+         if self._PARENT_TAGS.get(child, tag) != tag:
+            continue
+         candidates[token] = child
+      if len(candidates) == 0:
+         return {}
+      child_level = max(self.levels[child] for child in candidates.values())
+      return {token: child for token, child in candidates.items() if self.levels[child] == child_level}
+
+
+class CompactBoardGrammarState:
+   '''Parsing state of one text, fed one character at a time (see CompactBoardGrammar)'''
+
+   # what the next character can be
+   _WORD_START = 1   # an element or attribute token
+   _ELEMENT = 2      # right after an element token: a separator or the end
+   _VALUE = 3        # inside an attribute value
+   _DONE = 4         # after the end of board token
+
+   class _Frame:
+      '''An open element'''
+      __slots__ = ['tag', 'phase', 'level', 'attr_index', 'num_children', 'seen_children']
+
+      def __init__(self, tag, phase, level):
+         self.tag = tag
+         self.phase = phase         # phase of its children
+         self.level = level
+         self.attr_index = 0        # index of the next attribute that can still be added
+         self.num_children = 0
+         self.seen_children = set()
+
+   def __init__(self, grammar):
+      self.grammar = grammar
+      # TokenStringToBoard creates the <eagle> root itself
+      self.stack = [self._Frame(EAGLE, TranslationPhase.Top, grammar.levels[EAGLE])]
+      self.opened_tags = set()
+      self.mode = self._WORD_START
+      self.attribute = None
+      self.value = ''
+      # characters fed so far and, out of these, how many make a complete board
+      self.length = 0
+      self.complete_length = 0
+
+   def feed_text(self, text):
+      for char in text:
+         self.feed(char)
+
+   def feed(self, char):
+      '''Advances the state by one character. Raises an exception if the character is not legal'''
+      grammar = self.grammar
+      if self.mode == self._DONE:
+         raise Exception(f"Unexpected '{char}' after the end of the board")
+
+      if char == grammar.end_token:
+         if not self.can_end():
+            raise Exception(f"Board cannot end at position {self.length}")
+         self.mode = self._DONE
+         return
+
+      if self.mode == self._ELEMENT:
+         if char != grammar.separator:
+            raise Exception(f"Expected a separator at position {self.length}, got '{char}'")
+         self.mode = self._WORD_START
+      elif self.mode == self._VALUE:
+         options, complete = grammar.value_options(self.attribute, self.value)
+         if char == grammar.separator and complete:
+            self.mode = self._WORD_START
+         elif char in options:
+            self.value += char
+         else:
+            raise Exception(f"Unexpected '{char}' in the value of {self.attribute} at position {self.length}")
+      else:
+         top = self.stack[-1]
+         attributes = self.__NextAttributes(top)
+         for idx, (token, attr, _) in enumerate(attributes):
+            if token == char:
+               top.attr_index += idx + 1
+               self.attribute = attr
+               self.value = ''
+               self.mode = self._VALUE
+               break
+         else:
+            elements = self.__LegalElements()
+            if char not in elements:
+               raise Exception(f"Unexpected token '{char}' at position {self.length} in element {top.tag}")
+            depth, tag = elements[char]
+            del self.stack[depth+1:]
+            parent = self.stack[depth]
+            parent.num_children += 1
+            parent.seen_children.add(tag)
+            self.stack.append(self._Frame(tag, grammar.child_phase(tag, parent.phase), grammar.levels[tag]))
+            self.opened_tags.add(tag)
+            self.mode = self._ELEMENT
+
+      self.length += 1
+      if self.can_end():
+         self.complete_length = self.length
+
+   def allowed_chars(self):
+      '''Returns the set of characters that can come next'''
+      grammar = self.grammar
+      if self.mode == self._DONE:
+         return set()
+      if self.mode == self._WORD_START:
+         chars = {token for token, _, _ in self.__NextAttributes(self.stack[-1])}
+         chars.update(self.__LegalElements().keys())
+         return chars
+
+      if self.mode == self._ELEMENT:
+         chars = {grammar.separator}
+      else:
+         options, complete = grammar.value_options(self.attribute, self.value)
+         chars = set(options)
+         if complete:
+            chars.add(grammar.separator)
+      if self.can_end():
+         chars.add(grammar.end_token)
+      return chars
+
+   def allowed_mask(self):
+      '''Returns the boolean mask of the vocabulary indices that can come next'''
+      return self.grammar.mask(self.allowed_chars())
+
+   def can_end(self):
+      '''Whether the text read so far decodes into a complete board'''
+      if self.mode == self._ELEMENT:
+         pass
+      elif self.mode == self._VALUE:
+         if not self.grammar.value_options(self.attribute, self.value)[1]:
+            return False
+      else:
+         return False
+      if not {DRAWING, BOARD, PLAIN}.issubset(self.opened_tags):
+         return False
+      return all(self.__CanClose(frame) for frame in self.stack)
+
+   def __NextAttributes(self, frame):
+      '''Attributes that can come next: the following ones in encoding order, up to the first required one'''
+      if frame.num_children > 0:
+         return []
+      result = []
+      for attribute in self.grammar.attributes[frame.tag][frame.attr_index:]:
+         result.append(attribute)
+         if attribute[2]:
+            break
+      return result
+
+   def __HasRequiredAttributes(self, frame):
+      return not any(required for _, _, required in self.grammar.attributes[frame.tag][frame.attr_index:])
+
+   def __CanClose(self, frame):
+      return (self.__HasRequiredAttributes(frame) and
+         frame.num_children >= self.grammar._MIN_CHILDREN.get(frame.tag, 0))
+
+   def __LegalElements(self):
+      '''Returns the element tokens that can come next, as {token: (index of the parent in the stack, tag)}.
+      Like in TokenStringToBoard, a new element becomes the child of the closest open element
+      with a higher level; all the elements above that one are closed.'''
+      result = {}
+      for depth in range(len(self.stack)-1, -1, -1):
+         frame = self.stack[depth]
+         if not self.__HasRequiredAttributes(frame):
+            break
+         above_level = self.stack[depth+1].level if depth+1 < len(self.stack) else None
+         for token, tag in self.grammar.children[(frame.tag, frame.phase)].items():
+            if above_level is not None and above_level > self.grammar.levels[tag]:
+               continue
+            # <drawing>, <board>, <plain> and <signals> appear only once
+            if frame.phase is TranslationPhase.Top and tag in frame.seen_children:
+               continue
+            result.setdefault(token, (depth, tag))
+         # going further down the stack closes this element
+         if not self.__CanClose(frame):
+            break
+      return result
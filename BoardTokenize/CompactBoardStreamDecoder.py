@@ -0,0 +1,102 @@
+import lxml.etree as etree
+import sys
+from pathlib import Path
+file = Path(__file__).resolve()
+parent, root = file.parent, file.parents[1]
+sys.path.append(str(root))
+from BoardOperations.constants import *
+from BoardTokenize.CompactBoardTokenizer import CompactBoardTokenizer
+
+class CompactBoardStreamDecoder:
+   '''Push-style decoder for the CompactBoardTokenizer encoding.
+
+   Characters (feed) or whole tokens (feed_token) are pushed as they are generated, and the lxml
+   tree is built as they arrive: board() can be rendered at any time. Elements are nested like
+   TokenStringToBoard does it, a new element becomes the child of the closest open element with a
+   higher level, so a complete string decodes into the same board.
+
+   Errors are reported as soon as the offending character or token is pushed: an unknown token
+   (already at its first character), an empty token, or an element that would close the top
+   element (TokenStringToBoard drops everything after it). After an error the decoder must not be
+   used anymore.'''
+
+   def __init__(self, tokenizer=None):
+      self.tokenizer = tokenizer if tokenizer is not None else CompactBoardTokenizer()
+      self.tokens_to_tags = self.tokenizer._TOKENS_TO_TAGS
+      self.attribute_tokens = self.tokenizer._TOKENS_TO_ATTRIBUTES
+
+      self.root = etree.Element(EAGLE)
+      # open elements, the root is never closed
+      self.stack = [self.root]
+      # characters of the token being received
+      self.token = ''
+      self.num_tokens = 0
+      self.finished = False
+
+   def board(self):
+      '''Returns the board decoded so far (open elements are not cleaned yet)'''
+      return self.root
+
+   def feed(self, chars):
+      '''Pushes one or more characters. The end of board token finishes the board'''
+      tk = self.tokenizer
+      for char in chars:
+         self.__CheckNotFinished()
+         if char == tk._END_OF_BOARD:
+            self.finish()
+         elif char == tk._WORD_SEPARATOR:
+            self.feed_token(self.token)
+         else:
+            if self.token == '' and char not in self.tokens_to_tags and char not in self.attribute_tokens:
+               raise Exception(f"Unexpected token starting with '{char}' at index {self.num_tokens} in element {self.stack[-1].tag}")
+            self.token += char
+
+   def feed_token(self, token):
+      '''Pushes a whole token (without separator)'''
+      self.__CheckNotFinished()
+      self.token = ''
+      idx = self.num_tokens
+      self.num_tokens += 1
+      if token == '':
+         raise Exception(f"Empty token at index {idx} in element {self.stack[-1].tag}")
+
+      tag = self.tokens_to_tags.get(token)
+      if tag is None:
+         if len(self.stack) == 1:
+            raise Exception(f"unexpected token {token} at index {idx}, the board must start with an element")
+         # the token did not map to an element tag, assuming attribute code
+         self.tokenizer._DecodeAndAddAttributeToken(token, self.stack[-1], idx)
+         return
+
+      if len(self.stack) > 1:
+         levels = self.tokenizer._TAGS_TO_LEVELS
+         level = levels[tag]
+         # close the elements that are not above the new one
+         while len(self.stack) > 2 and levels[self.stack[-1].tag] <= level:
+            self.tokenizer._CleanElement(self.stack.pop())
+         if levels[self.stack[-1].tag] <= level:
+            raise Exception(f"Token {token} at index {idx} would close the top element {self.stack[-1].tag}")
+
+      child = etree.SubElement(self.stack[-1], tag)
+      if tag == SIGNAL:
+         # add the name attribute
+         child.attrib[NAME] = f'sig{self.tokenizer._signalIndex}'
+         self.tokenizer._signalIndex += 1
+      if self.tokenizer._verbosity > 0:
+         print(f"Opening tag '{tag}' at position {self.num_tokens}")
+      self.stack.append(child)
+
+   def finish(self):
+      '''Decodes the last token, cleans the open elements and returns the board'''
+      if self.finished:
+         return self.root
+      if self.token != '' or self.num_tokens > 0:
+         self.feed_token(self.token)
+      while len(self.stack) > 1:
+         self.tokenizer._CleanElement(self.stack.pop())
+      self.finished = True
+      return self.root
+
+   def __CheckNotFinished(self):
+      if self.finished:
+         raise Exception("The board is already finished")
@@ -6,8 +6,6 @@ file = Path(__file__).resolve()
 parent, root = file.parent, file.parents[1]
 sys.path.append(str(root))
 from BoardOperations.constants import *
-from collections import deque
-from collections import namedtuple
 from BoardTokenize.BaseBoardTokenizer import BaseBoardTokenizer
 
 class TranslationPhase(Enum):
@@ -60,6 +58,9 @@ class CompactBoardTokenizer(BaseBoardTokenizer):
       EAGLE: 6
    }
 
+   # reverse lookup of the element tokens of all phases, built once
+   _TOKENS_TO_TAGS = {token: tag for tags in (_TOP_TAGS, _SIGNALS_TAGS, _PLAINS_TAGS) for tag, token in tags.items()}
+
    ###########################################################
    #### board to tokens translation
    ###########################################################
@@ -67,24 +68,18 @@ class CompactBoardTokenizer(BaseBoardTokenizer):
    def __init__(self, verbosity=0):
       super(CompactBoardTokenizer, self).__init__(verbosity)
 
-   def _TokenizeElement(self, elem):
-      return self.__TokenizeElementByPhase(elem, TranslationPhase.Top)
-
-   def __TokenizeElementByPhase(self, elem, phase):
-      tokens = []
-      beginElemToken, newPhase = self.__getTokenForElement(elem, phase)
-      tokens.append(beginElemToken)
-
-      stringAttributes = self._TokenizeAttributes(elem)
-      if stringAttributes:
-         tokens.append(stringAttributes)
-
-      # recurse on children elements
-      for child in elem:
-         tokens.append(self.__TokenizeElementByPhase(child, newPhase))
-
-      stringResult = self._WORD_SEPARATOR.join(tokens)
-      return stringResult
+   def _IterElementTokens(self, elem):
+      '''Yields the tokens of an element and its children, walking the tree once.
+      The phase of each open element's children is kept on a stack'''
+      phases = [TranslationPhase.Top]
+      for event, crtElem in etree.iterwalk(elem, events=('start', 'end')):
+         if event == 'end':
+            phases.pop()
+            continue
+         beginElemToken, newPhase = self.__getTokenForElement(crtElem, phases[-1])
+         phases.append(newPhase)
+         yield beginElemToken
+         yield from self._IterAttributeTokens(crtElem)
 
    def __getTokenForElement(self, elem, phase):
       tag = elem.tag
@@ -120,70 +115,56 @@ class CompactBoardTokenizer(BaseBoardTokenizer):
          tokenString = tokenString.replace(self._END_OF_BOARD, '')
 
       tokens = tokenString.split(self._WORD_SEPARATOR)
-      tokenStack = namedtuple('TokenStack', ['tokens', 'stack', 'idx'])
-      tokenStack.tokens = tokens
-      tokenStack.idx = 0
-      self.__tokens_to_elements(root, tokenStack)
+      self.__tokens_to_elements(root, tokens)
 
       return root
 
-   def __tokens_to_elements(self, parent, ts):
-      element_token = ts.tokens[ts.idx]
-      ts.idx += 1
-
-      tag = self.__TokenMapsToElementTag(element_token)
-      if tag is None:
-         raise Exception('unexpected token {} in context {}'.format(element_token, ' '.join(ts.tokens[ts.idx-2:ts.idx+2])))
-
-      child = etree.SubElement(parent, tag)
-      if (tag == SIGNAL):
-         # add the name attribute
-         child.attrib[NAME] = f'sig{self._signalIndex}'
-         self._signalIndex += 1
-      if self._verbosity > 0:
-         print(f"Opening tag '{tag}' at position {ts.idx}")
-      while True:
-         # there's no 'end element' token, so if at the end, just pop and return
-         if ts.idx >= len(ts.tokens):
-            self._CleanElement(child)
-            return
-
-         crtToken = ts.tokens[ts.idx]
-         tag = self.__TokenMapsToElementTag(crtToken)
+   def __tokens_to_elements(self, root, tokens):
+      '''Decodes the tokens in one pass, with an explicit stack of the open elements.
+      A new element becomes the child of the closest open element with a higher level, the open
+      elements below that one are closed. The first token is the top element: the tokens after
+      it is closed are ignored.'''
+      tokensToTags = self._TOKENS_TO_TAGS
+      tagsToLevels = self._TAGS_TO_LEVELS
+      # open elements and their levels
+      elemStack = []
+      levelStack = []
+      for idx, crtToken in enumerate(tokens):
+         tag = tokensToTags.get(crtToken)
          if tag is None:
+            if not elemStack:
+               raise Exception('unexpected token {} in context {}'.format(crtToken, ' '.join(tokens[idx-1:idx+3])))
             # the token did not map to an element tag, assuming attribute code
-            self._DecodeAndAddAttributeToken(crtToken, child, ts.idx)
-            ts.idx += 1
+            self._DecodeAndAddAttributeToken(crtToken, elemStack[-1], idx)
+            continue
+
+         level = tagsToLevels[tag]
+         if not elemStack:
+            # the first token
+            parent = root
          else:
-            # have to either dive recursively or return to above
-            levelDifference = self.__GetLevelDifference(child.tag, tag)
-            if levelDifference <= 0:
-               self._CleanElement(child)
+            # there's no 'end element' token, elements end when a same or higher level element starts
+            while elemStack and levelStack[-1] <= level:
+               levelStack.pop()
+               self._CleanElement(elemStack.pop())
+            if not elemStack:
+               # the top element was closed
                return
-            else:
-               self.__tokens_to_elements(child, ts)
-
-   def __GetLevelDifference(self, crtTag, nextTag):
-      crtTagLevel = self._TAGS_TO_LEVELS[crtTag]
-      nextTagLevel = self._TAGS_TO_LEVELS[nextTag]
-      return crtTagLevel - nextTagLevel
-
-   def __TokenMapsToElementTag(self, token):
-      dict = self._PLAINS_TAGS
-      tags = [tag for tag,code in dict.items() if code==token]
-      if len(tags) > 0:
-         return tags[0]
-      
-      dict = self._SIGNALS_TAGS
-      tags = [tag for tag,code in dict.items() if code==token]
-      if len(tags) > 0:
-         return tags[0]
-
-      dict = self._TOP_TAGS
-      tags = [tag for tag,code in dict.items() if code==token]
-      if len(tags) > 0:
-         return tags[0]
-      return None
+            parent = elemStack[-1]
+
+         child = etree.SubElement(parent, tag)
+         if (tag == SIGNAL):
+            # add the name attribute
+            child.attrib[NAME] = f'sig{self._signalIndex}'
+            self._signalIndex += 1
+         if self._verbosity > 0:
+            print(f"Opening tag '{tag}' at position {idx+1}")
+         elemStack.append(child)
+         levelStack.append(level)
+
+      # at the end, close all the open elements
+      while elemStack:
+         self._CleanElement(elemStack.pop())
 
    def _AddToVocab(self, vocab, crt_idx):
       start_idx = crt_idx
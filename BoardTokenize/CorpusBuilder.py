@@ -0,0 +1,213 @@
+"""
+Builds a tokenized dataset (e.g. data/textgenrnn_dataset) from a folder of scraped Eagle boards.
+
+Usage: python CorpusBuilder.py input_folder output_folder [--tokenizer compact|tree] [--workers N]
+   [--combined-file eagleCompact.txt] [--package-cache-folder folder] [--force]
+
+Every .brd file under input_folder is condensed, flattened and tokenized in a pool of processes.
+The token string of each board is written to output_folder/tokens/<relative path>.tokens, and all of
+them (one board per line, in file name order) to output_folder/<combined file>. Boards that cannot be
+processed are skipped and listed, with their error, in output_folder/failed.txt.
+
+Rebuilds are incremental: output_folder/manifest.json records the hash of each board and of the
+configuration it was processed with (tokenizer class and version, LAYERS_TO_KEEP, ATTRIBUTE_DEFAULTS,
+package transformation version). Only boards whose file or configuration changed are processed again,
+the others are read back from their .tokens files (--force processes all of them).
+"""
+import sys, os, time, argparse, hashlib, json
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+file = Path(__file__).resolve()
+parent, root = file.parent, file.parents[1]
+sys.path.append(str(root))
+from BoardOperations.constants import LAYERS_TO_KEEP
+from BoardOperations import brdFile, cleanup, packageCache
+from BoardOperations.packageCache import PackageCache
+import BoardTokenize
+from BoardTokenize.CompactBoardTokenizer import CompactBoardTokenizer
+from BoardTokenize.TreeBoardTokenizer import TreeBoardTokenizer
+
+TOKENIZERS = {
+   'compact': CompactBoardTokenizer,
+   'tree': TreeBoardTokenizer
+}
+DEFAULT_COMBINED_FILE = 'eagleCompact.txt'
+TOKENS_FOLDER = 'tokens'
+FAILURES_FILE = 'failed.txt'
+MANIFEST_FILE = 'manifest.json'
+MANIFEST_VERSION = 1
+# seconds between two progress reports
+PROGRESS_INTERVAL = 2.0
+
+# state of a worker process, set once by _init_worker
+_worker_tokenizer = None
+_worker_package_cache = None
+
+def find_board_files(input_folder):
+   '''Returns all the .brd files under input_folder, sorted'''
+   board_files = []
+   for folder, _, file_names in os.walk(input_folder):
+      for file_name in file_names:
+         if file_name.lower().endswith('.brd'):
+            board_files.append(os.path.join(folder, file_name))
+   return sorted(board_files)
+
+def get_tokens_file_name(input_folder, board_file, output_folder):
+   '''Returns the .tokens file of a board, mirroring its path under input_folder'''
+   relative_name = os.path.splitext(os.path.relpath(board_file, input_folder))[0]
+   return os.path.join(output_folder, TOKENS_FOLDER, relative_name + '.tokens')
+
+def hash_file(file_name):
+   '''Returns the sha1 (hex digest) of the contents of a file'''
+   digest = hashlib.sha1()
+   with open(file_name, 'rb') as f:
+      for block in iter(lambda: f.read(1 << 20), b''):
+         digest.update(block)
+   return digest.hexdigest()
+
+def get_config_hash(tokenizer_name):
+   '''Returns the hash of everything, other than the board itself, a token string depends on'''
+   config = {
+      'tokenizer': TOKENIZERS[tokenizer_name].__name__,
+      'tokenizer_version': BoardTokenize.__version__,
+      'layers_to_keep': sorted(LAYERS_TO_KEEP),
+      'attribute_defaults': cleanup.ATTRIBUTE_DEFAULTS,
+      'package_cache_version': packageCache.CACHE_VERSION
+   }
+   return hashlib.sha1(json.dumps(config, sort_keys=True).encode('utf-8')).hexdigest()
+
+def read_manifest(output_folder):
+   '''Returns the boards recorded in the manifest of a previous build, as a dict relative path -> entry'''
+   manifest_file = os.path.join(output_folder, MANIFEST_FILE)
+   if not os.path.exists(manifest_file):
+      return {}
+   with open(manifest_file, 'r', encoding='utf-8') as f:
+      manifest = json.load(f)
+   if manifest.get('version') != MANIFEST_VERSION:
+      return {}
+   return manifest['boards']
+
+def write_manifest(output_folder, boards):
+   '''Writes the manifest (atomically, an interrupted build keeps the previous one)'''
+   manifest_file = os.path.join(output_folder, MANIFEST_FILE)
+   with open(manifest_file + '.tmp', 'w', encoding='utf-8') as f:
+      json.dump({'version': MANIFEST_VERSION, 'boards': boards}, f, indent=1, sort_keys=True)
+   os.replace(manifest_file + '.tmp', manifest_file)
+
+def is_up_to_date(entry, board_hash, config_hash, tokens_file):
+   '''Determines whether a board was already processed, with the same contents and configuration'''
+   if entry is None or entry['hash'] != board_hash or entry['config'] != config_hash:
+      return False
+   # a failed board stays failed until it changes, a tokenized one needs its .tokens file
+   return entry['error'] is not None or os.path.exists(tokens_file)
+
+def _init_worker(tokenizer_name, package_cache_folder):
+   global _worker_tokenizer, _worker_package_cache
+   _worker_tokenizer = TOKENIZERS[tokenizer_name]()
+   # without a folder, the process-wide cache of flatten is used
+   if package_cache_folder is not None:
+      _worker_package_cache = PackageCache(cache_folder=package_cache_folder)
+
+def tokenize_board_file(board_file, tokens_file):
+   '''Condenses, flattens and tokenizes a board, and writes its token string to tokens_file.
+   Returns (token string, None), or (None, error message) when the board cannot be processed'''
+   try:
+      board_root = brdFile.read_board_root(board_file)
+      board_root = brdFile.getCondensedBoardFromEagle(board_root, flatten_board=True,
+         package_cache=_worker_package_cache)
+      token_string = _worker_tokenizer.BoardToTokenString(board_root)
+      os.makedirs(os.path.dirname(tokens_file), exist_ok=True)
+      brdFile.write_utf8_string_to_file(tokens_file, token_string)
+      return token_string, None
+   except Exception as e:
+      return None, f"{type(e).__name__}: {e}"
+
+def _tokenize_task(task):
+   return tokenize_board_file(*task)
+
+def build_corpus(input_folder, output_folder, tokenizer_name='compact', workers=None,
+      combined_file=DEFAULT_COMBINED_FILE, package_cache_folder=None, chunk_size=4, verbose=True, force=False):
+   '''Tokenizes all the boards under input_folder into output_folder (see the module description).
+   Returns the number of boards tokenized and the list of (board file, error) of the failed ones'''
+   if tokenizer_name not in TOKENIZERS:
+      raise Exception(f"Unknown tokenizer {tokenizer_name}, expected one of {list(TOKENIZERS)}")
+   board_files = find_board_files(input_folder)
+   tasks = [(board_file, get_tokens_file_name(input_folder, board_file, output_folder)) for board_file in board_files]
+   os.makedirs(output_folder, exist_ok=True)
+
+   # find the boards whose contents or configuration changed since the last build
+   config_hash = get_config_hash(tokenizer_name)
+   previous_boards = {} if force else read_manifest(output_folder)
+   boards = {}
+   stale_tasks = []
+   for board_file, tokens_file in tasks:
+      relative_name = os.path.relpath(board_file, input_folder).replace(os.sep, '/')
+      board_hash = hash_file(board_file)
+      entry = previous_boards.get(relative_name)
+      if not is_up_to_date(entry, board_hash, config_hash, tokens_file):
+         entry = {'hash': board_hash, 'config': config_hash, 'error': None}
+         stale_tasks.append((board_file, tokens_file))
+      boards[relative_name] = entry
+   if verbose:
+      print(f"{len(stale_tasks)} of {len(tasks)} boards to process")
+
+   failures = []
+   num_done = 0
+   num_chars = 0
+   start = last_report = time.perf_counter()
+   with open(os.path.join(output_folder, combined_file), 'w', encoding='utf-8') as combined, \
+         ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+            initargs=(tokenizer_name, package_cache_folder)) as executor:
+      # map returns the results in the order of the boards, the combined file does not depend on scheduling
+      results = executor.map(_tokenize_task, stale_tasks, chunksize=chunk_size)
+      stale_boards = set(board_file for board_file, _ in stale_tasks)
+      for board_file, tokens_file in tasks:
+         entry = boards[os.path.relpath(board_file, input_folder).replace(os.sep, '/')]
+         if board_file in stale_boards:
+            token_string, error = next(results)
+            entry['error'] = error
+         elif entry['error'] is None:
+            token_string, error = brdFile.read_utf8_file_to_string(tokens_file), None
+         else:
+            token_string, error = None, entry['error']
+
+         if error is None:
+            combined.write(token_string)
+            combined.write('\n')
+            num_chars += len(token_string)
+         else:
+            failures.append((board_file, error))
+            if verbose:
+               print(f"Failed {board_file}: {error}")
+
+         num_done += 1
+         now = time.perf_counter()
+         if verbose and (now - last_report >= PROGRESS_INTERVAL or num_done == len(tasks)):
+            last_report = now
+            elapsed = now - start
+            print(f"[{num_done}/{len(tasks)}] {num_done/elapsed:8.1f} boards/s {num_chars/elapsed/1000:10.1f} kchars/s"
+               f" {len(failures)} failed")
+
+   # boards no longer in input_folder are dropped from the manifest
+   write_manifest(output_folder, boards)
+   with open(os.path.join(output_folder, FAILURES_FILE), 'w', encoding='utf-8') as f:
+      for board_file, error in failures:
+         f.write(f"{board_file}\t{error}\n")
+
+   return num_done - len(failures), failures
+
+if __name__ == "__main__":
+   parser = argparse.ArgumentParser(description="Builds a tokenized dataset from a folder of Eagle boards")
+   parser.add_argument('input_folder', help="folder with the .brd files (searched recursively)")
+   parser.add_argument('output_folder', help="folder for the .tokens files and the combined dataset")
+   parser.add_argument('--tokenizer', default='compact', choices=sorted(TOKENIZERS))
+   parser.add_argument('--workers', type=int, default=None, help="number of processes (default: number of CPUs)")
+   parser.add_argument('--combined-file', default=DEFAULT_COMBINED_FILE)
+   parser.add_argument('--package-cache-folder', default=None,
+      help="folder where transformed packages are shared between processes and runs")
+   parser.add_argument('--force', action='store_true', help="process all the boards, even the unchanged ones")
+   args = parser.parse_args()
+
+   num_tokenized, failures = build_corpus(args.input_folder, args.output_folder, args.tokenizer, args.workers,
+      args.combined_file, args.package_cache_folder, force=args.force)
+   print(f"Tokenized {num_tokenized} boards, {len(failures)} failed")
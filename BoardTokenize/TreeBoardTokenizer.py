@@ -5,8 +5,6 @@ file = Path(__file__).resolve()
 parent, root = file.parent, file.parents[1]
 sys.path.append(str(root))
 from BoardOperations.constants import *
-from collections import deque
-from collections import namedtuple
 from BoardTokenize.BaseBoardTokenizer import BaseBoardTokenizer
 
 class TreeBoardTokenizer(BaseBoardTokenizer):
@@ -25,6 +23,9 @@ class TreeBoardTokenizer(BaseBoardTokenizer):
       SIGNALS:   ('G', 'g'),
       BOARD:     ('B', 'b')
    }
+
+   # reverse lookup of the start tokens, built once
+   _START_TOKENS_TO_TAGS = {startToken: tag for tag, (startToken, _) in _TAGS_TO_TOKENS.items()}
    
    ###############################################################################
    #####  board to tokens translation
@@ -33,25 +34,15 @@ class TreeBoardTokenizer(BaseBoardTokenizer):
    def __init__(self, verbosity=0):
       super(TreeBoardTokenizer, self).__init__(verbosity)
    
-   def _TokenizeElement(self, elem):
-      '''Transforms an XML element into tokens'''
-      tokens = []
-      beginToken,endToken = self._TAGS_TO_TOKENS[elem.tag]
-      tokens.append(beginToken)
-      
-      # append attributes only if not empty
-      stringAttributes = self._TokenizeAttributes(elem)
-      if stringAttributes:
-         tokens.append(stringAttributes)
-      
-      #recurse on children elements
-      for child in elem:
-         tokens.append(self._TokenizeElement(child))
-
-      tokens.append(endToken)
-
-      stringResult = self._WORD_SEPARATOR.join(tokens)
-      return stringResult
+   def _IterElementTokens(self, elem):
+      '''Yields the tokens of an XML element and its children, walking the tree once'''
+      for event, crtElem in etree.iterwalk(elem, events=('start', 'end')):
+         beginToken, endToken = self._TAGS_TO_TOKENS[crtElem.tag]
+         if event == 'start':
+            yield beginToken
+            yield from self._IterAttributeTokens(crtElem)
+         else:
+            yield endToken
 
    ###############################################################################
    #####  tokens to board translation
@@ -64,61 +55,43 @@ class TreeBoardTokenizer(BaseBoardTokenizer):
          tokenString = tokenString.replace(self._END_OF_BOARD, '')
       tokens = tokenString.split(self._WORD_SEPARATOR)
 
-      tokenStack = namedtuple('TokenStack', ['tokens', 'stack', 'idx'])
-      tokenStack.stack = deque()
-      tokenStack.tokens = tokens
-      tokenStack.idx = 0
-      self.__tokens_to_elements(root,tokenStack)
-
-      if len(tokenStack.stack) != 0:
-         raise Exception("Unclosed elements {}".format(tokenStack.stack))
+      self.__tokens_to_elements(root, tokens)
 
       return root
 
-   def __tokens_to_elements(self, parent, ts):
-      '''Translates recursively a list of tokens into an element'''
-
-      # get element at idx
-      element_token = ts.tokens[ts.idx]
-      ts.idx+=1
-      tag, startToken, endToken = self.__starts_element(element_token)
-      if tag is None:
-         raise Exception("Unrecognized token {} at index {}".format(element_token, ts.idx))
-
-      ts.stack.append(startToken)
-      child = etree.SubElement(parent, tag)
-      if (tag == SIGNAL):
-         # add the name attribute
-         child.attrib[NAME] = f'sig{self._signalIndex}'
-         self._signalIndex += 1
-      while True:
-         if ts.idx >= len(ts.tokens):
-            raise Exception("Badly formatted string, unclosed element {}".format(ts.stack.pop()))
-
-         crtToken = ts.tokens[ts.idx]
+   def __tokens_to_elements(self, root, tokens):
+      '''Translates a list of tokens into the top element, in one pass with an explicit stack of
+      the open elements. The tokens after the top element is closed are ignored'''
+      if not tokens or tokens[0] not in self._START_TOKENS_TO_TAGS:
+         raise Exception("Unrecognized token {} at index {}".format(tokens[0] if tokens else None, 1))
 
+      # open elements and their end tokens
+      elemStack = []
+      endStack = []
+      for idx, crtToken in enumerate(tokens):
          # check if element is being closed
-         if crtToken == endToken:
-            ts.idx += 1
-            ts.stack.pop()
-            self._CleanElement(child)
-            return
+         if endStack and crtToken == endStack[-1]:
+            endStack.pop()
+            self._CleanElement(elemStack.pop())
+            if not elemStack:
+               return
+            continue
 
          # check if start of a new element
-         childTag, _, _ = self.__starts_element(crtToken)
-         if childTag is not None:
-            self.__tokens_to_elements(child, ts)
+         tag = self._START_TOKENS_TO_TAGS.get(crtToken)
+         if tag is not None:
+            child = etree.SubElement(elemStack[-1] if elemStack else root, tag)
+            if (tag == SIGNAL):
+               # add the name attribute
+               child.attrib[NAME] = f'sig{self._signalIndex}'
+               self._signalIndex += 1
+            elemStack.append(child)
+            endStack.append(self._TAGS_TO_TOKENS[tag][1])
             continue
 
-         self._DecodeAndAddAttributeToken(crtToken, child, ts.idx)
-
-         ts.idx += 1
+         self._DecodeAndAddAttributeToken(crtToken, elemStack[-1], idx)
 
-   def __starts_element(self, token):
-      for tag in self._TAGS_TO_TOKENS:
-         if token == self._TAGS_TO_TOKENS[tag][0]:
-            return tag, self._TAGS_TO_TOKENS[tag][0], self._TAGS_TO_TOKENS[tag][1]
-      return None, None, None
+      raise Exception("Badly formatted string, unclosed element {}".format(self._TAGS_TO_TOKENS[elemStack[-1].tag][0]))
 
    ###############################################################################
    #####  special functions
@@ -0,0 +1,110 @@
+"""
+## KV-cached decoding for the mini GPT model
+The full model re-runs the whole (padded) maxlen sequence through the causal
+TransformerBlock for every generated token. Since the attention is causal, the
+keys/values of a position never change once it has been seen, so they are cached
+and each step only computes the new position.
+"""
+import numpy as np
+
+
+def layer_norm(x, gamma, beta, epsilon):
+   """ Same computation as layers.LayerNormalization over the last axis """
+   mean = np.mean(x, axis=-1, keepdims=True)
+   variance = np.var(x, axis=-1, keepdims=True)
+   return (x - mean) / np.sqrt(variance + epsilon) * gamma + beta
+
+def find_layer(model, has_attributes):
+   """ Returns the only layer of the model having all the given attributes (sub-layers) """
+   found = [layer for layer in model.layers if all(hasattr(layer, _) for _ in has_attributes)]
+   if len(found) != 1:
+      raise ValueError(f"Expected one layer with {', '.join(has_attributes)} in the model, found {len(found)}")
+   return found[0]
+
+class KVCacheDecoder():
+   """Runs a trained mini GPT model (see create_gpt_model) one position at a time.
+
+   The weights are read once from the model's TokenAndPositionEmbedding, TransformerBlock
+   and output Dense layers; the decoding itself is done in numpy. A new position only needs
+   a lookup in the two embedding tables, so only the key/value projections are cached.
+
+   Position embeddings are absolute, so the cache is only valid while the sequence fits in
+   maxlen. After that the window slides: the oldest `shift` tokens are dropped and the cache
+   is rebuilt from the remaining ones in a single pass. Every token still sees at least
+   maxlen - shift tokens of context.
+   """
+   def __init__(self, model, shift=None):
+      # found by their sub-layers rather than their class, which a model loaded without its
+      # custom_objects does not have; the output layer makes the first output of the model
+      embedding_layer = find_layer(model, ['token_emb', 'pos_emb'])
+      transformer_block = find_layer(model, ['att', 'ffn', 'layernorm1', 'layernorm2'])
+      output_layer = model.get_layer(name=model.output_names[0])
+
+      self.token_emb = embedding_layer.token_emb.get_weights()[0]
+      self.pos_emb = embedding_layer.pos_emb.get_weights()[0]
+      self.maxlen = self.pos_emb.shape[0]
+      self.shift = shift if shift is not None else max(1, self.maxlen // 4)
+
+      (self.query_kernel, self.query_bias,
+       self.key_kernel, self.key_bias,
+       self.value_kernel, self.value_bias,
+       self.output_kernel, self.output_bias) = transformer_block.att.get_weights()
+      num_heads, key_dim = self.query_bias.shape
+      self.scale = 1.0 / np.sqrt(float(key_dim))
+
+      self.ffn1_kernel, self.ffn1_bias, self.ffn2_kernel, self.ffn2_bias = transformer_block.ffn.get_weights()
+      self.norm1 = transformer_block.layernorm1.get_weights() + [transformer_block.layernorm1.epsilon]
+      self.norm2 = transformer_block.layernorm2.get_weights() + [transformer_block.layernorm2.epsilon]
+      self.dense_kernel, self.dense_bias = output_layer.get_weights()
+
+      self.key_cache = np.zeros((self.maxlen, num_heads, key_dim), dtype=np.float32)
+      self.value_cache = np.zeros((self.maxlen, num_heads, key_dim), dtype=np.float32)
+      self.tokens = []
+
+   def start(self, tokens):
+      """ Resets the cache and feeds the prompt tokens. Returns the logits of the next token """
+      tokens = list(tokens)
+      if len(tokens) == 0:
+         raise ValueError("Cannot start decoding from an empty prompt")
+      if len(tokens) > self.maxlen:
+         tokens = tokens[-self.maxlen:]
+      self.tokens = tokens
+      return self.__forward(tokens, 0)
+
+   def step(self, token):
+      """ Feeds one more token. Returns the logits of the next token """
+      if len(self.tokens) == self.maxlen:
+         # slide the window and rebuild the cache for the new positions
+         return self.start(self.tokens[self.shift:] + [token])
+      start_position = len(self.tokens)
+      self.tokens.append(token)
+      return self.__forward([token], start_position)
+
+   def __forward(self, tokens, start_position):
+      """ Computes the new positions [start_position, start_position+len(tokens)) on top of the cache """
+      end_position = start_position + len(tokens)
+      positions = np.arange(start_position, end_position)
+      x = self.token_emb[tokens] + self.pos_emb[positions]
+
+      # multi-head attention, the keys/values of the new positions are added to the cache
+      query = np.einsum('td,dhk->thk', x, self.query_kernel) + self.query_bias
+      self.key_cache[start_position:end_position] = np.einsum('td,dhk->thk', x, self.key_kernel) + self.key_bias
+      self.value_cache[start_position:end_position] = np.einsum('td,dhk->thk', x, self.value_kernel) + self.value_bias
+      keys = self.key_cache[:end_position]
+      values = self.value_cache[:end_position]
+
+      scores = np.einsum('thk,shk->hts', query * self.scale, keys)
+      causal_mask = np.arange(end_position)[None, :] <= positions[:, None]
+      scores = np.where(causal_mask[None, :, :], scores, -1e9)
+      scores = np.exp(scores - np.max(scores, axis=-1, keepdims=True))
+      scores = scores / np.sum(scores, axis=-1, keepdims=True)
+      attention = np.einsum('hts,shk->thk', scores, values)
+      attention_output = np.einsum('thk,hkd->td', attention, self.output_kernel) + self.output_bias
+
+      # rest of the transformer block (dropouts are inactive when predicting)
+      out1 = layer_norm(x + attention_output, *self.norm1)
+      ffn_output = np.maximum(np.dot(out1, self.ffn1_kernel) + self.ffn1_bias, 0)
+      ffn_output = np.dot(ffn_output, self.ffn2_kernel) + self.ffn2_bias
+      out2 = layer_norm(out1 + ffn_output, *self.norm2)
+
+      return np.dot(out2[-1], self.dense_kernel) + self.dense_bias
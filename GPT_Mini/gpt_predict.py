@@ -11,6 +11,11 @@ import string
 import random
 
 from gpt_dataset import read_dataset
+from gpt_decode import KVCacheDecoder
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from ModelInference.predictor import FastPredictor
+from ModelInference.sampler import Sampler
 
 class GptTextGenerator():
    """A class to generate circuit boards using a pre-trained GPT Mini model"""
@@ -23,6 +28,10 @@ class GptTextGenerator():
       model_path = os.path.join(model_path, model_name)
       self.model = load_model(model_path)
       self.maxlen = self.model.get_layer(name="InputLayer").output_shape[0][1]
+      # compiled predict step, model.predict is too slow to call once per token
+      self.predictor = FastPredictor(self.model)
+      # key/value cache decoder, used unless generate() is asked not to
+      self.decoder = KVCacheDecoder(self.model)
 
       # load the vocabulary
       dataset_folders = [os.path.abspath(os.path.join(os.path.dirname(__file__), _)) for _ in dataset_folders]
@@ -31,6 +40,8 @@ class GptTextGenerator():
       # some internal variables
       self.max_tokens = 10000
       self.top_k = 5
+      # samples from the top_k tokens, never the padding (index 0)
+      self.sampler = Sampler(top_k=self.top_k)
 
    def map_vocabulary_to_index(self, vocab):
       word_to_index = {}
@@ -39,14 +50,9 @@ class GptTextGenerator():
       return word_to_index
 
    def sample_from(self, logits):
-      top_k = 5  # how many possibilities to generate
-      logits, indices = tf.math.top_k(logits, k=self.top_k, sorted=True)
-      indices = np.asarray(indices).astype("int32")
-      preds = keras.activations.softmax(tf.expand_dims(logits, 0))[0]
-      preds = np.asarray(preds).astype("float32")
-      return np.random.choice(indices, p=preds)
+      return self.sampler.sample_logits(logits)
 
-   def generate(self, start_prompt, max_tokens_to_generate=None, termination_token = "|"):
+   def generate(self, start_prompt, max_tokens_to_generate=None, termination_token = "|", use_cache=True):
       max_tokens = max_tokens_to_generate if max_tokens_to_generate is not None else self.DEFAULT_MAX_TOKENS
       print(max_tokens)
       word_to_index = self.map_vocabulary_to_index(self.vocab)
@@ -55,19 +61,28 @@ class GptTextGenerator():
       num_tokens_generated = 0
       tokens_generated = []
 
+      # with the cache, only the newly sampled token is run through the model at each step;
+      # the cache needs at least one token to start from
+      use_cache = use_cache and len(start_tokens) > 0
+      if use_cache:
+         logits = self.decoder.start(start_tokens)
+
       while num_tokens_generated <= max_tokens:
-         pad_len = self.maxlen - len(start_tokens)
-         sample_index = len(start_tokens) - 1
-         if pad_len < 0:
-            x = start_tokens[:self.maxlen]
-            sample_index = self.maxlen - 1
-         elif pad_len > 0:
-            x = start_tokens + [0] * pad_len
-         else:
-            x = start_tokens
-         x = np.array([x])
-         y, _ = self.model.predict(x)
-         sample_token = self.sample_from(y[0][sample_index])
+         if not use_cache:
+            pad_len = self.maxlen - len(start_tokens)
+            sample_index = len(start_tokens) - 1
+            if pad_len < 0:
+               # sliding window over the latest tokens
+               x = start_tokens[-self.maxlen:]
+               sample_index = self.maxlen - 1
+            elif pad_len > 0:
+               x = start_tokens + [0] * pad_len
+            else:
+               x = start_tokens
+            x = np.array([x])
+            y, _ = self.predictor.predict(x)
+            logits = y[0][sample_index]
+         sample_token = self.sample_from(logits)
          tokens_generated.append(sample_token)
          start_tokens.append(sample_token)
          if (num_tokens_generated % 10 == 0):
@@ -75,15 +90,18 @@ class GptTextGenerator():
          if (self.vocab[sample_token] == termination_token):
             break
          num_tokens_generated = len(tokens_generated)
+         if use_cache:
+            logits = self.decoder.step(sample_token)
       txt = "".join(
          [self.vocab[_] for _ in start_tokens + tokens_generated]
       )
       print("")
       return txt
 
-# the starting prompt
-start_prompt = "D B N C Ӿ50.0"
+if __name__ == "__main__":
+   # the starting prompt
+   start_prompt = "D B N C Ӿ50.0"
 
-generator = GptTextGenerator("gpt4096")
-generated_text = generator.generate(start_prompt, max_tokens_to_generate=200)
-print(f"generated text:\n{generated_text}\n")
+   generator = GptTextGenerator("gpt4096")
+   generated_text = generator.generate(start_prompt, max_tokens_to_generate=200)
+   print(f"generated text:\n{generated_text}\n")
@@ -37,6 +37,10 @@ import random
 
 from gpt_model import create_gpt_model
 from gpt_dataset import read_dataset
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from ModelInference.predictor import FastPredictor
+from ModelInference.sampler import Sampler
 
 
 
@@ -91,13 +95,13 @@ class TextGenerator(keras.callbacks.Callback):
       self.index_to_word = index_to_word
       self.print_every = print_every
       self.k = top_k
+      # samples from the top_k tokens, never the padding (index 0)
+      self.sampler = Sampler(top_k=top_k)
+      # compiled predict step, built once the model is set on the callback
+      self.predictor = None
 
    def sample_from(self, logits):
-      logits, indices = tf.math.top_k(logits, k=self.k, sorted=True)
-      indices = np.asarray(indices).astype("int32")
-      preds = keras.activations.softmax(tf.expand_dims(logits, 0))[0]
-      preds = np.asarray(preds).astype("float32")
-      return np.random.choice(indices, p=preds)
+      return self.sampler.sample_logits(logits)
 
    def detokenize(self, number):
       return self.index_to_word[number]
@@ -119,7 +123,9 @@ class TextGenerator(keras.callbacks.Callback):
          else:
                x = start_tokens
          x = np.array([x])
-         y, _ = self.model.predict(x)
+         if self.predictor is None or self.predictor.model is not self.model:
+            self.predictor = FastPredictor(self.model)
+         y, _ = self.predictor.predict(x)
          sample_token = self.sample_from(y[0][sample_index])
          tokens_generated.append(sample_token)
          start_tokens.append(sample_token)
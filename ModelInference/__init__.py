@@ -0,0 +1,4 @@
+"""
+Fast inference helpers shared by the text generation models
+"""
+__version__ = '0.1.0'
@@ -0,0 +1,33 @@
+import numpy as np
+import tensorflow as tf
+
+
+class FastPredictor:
+   '''Runs a Keras model through a traced tf.function with a fixed input signature.
+
+   model.predict() sets up a data adapter, callbacks and a progress bar on every call, which
+   dominates the cost of the one-token-at-a-time sampling loops. The function here is traced
+   once per model (the signature keeps the batch dimension of the model's inputs, usually None)
+   and then called directly.
+   predict() returns numpy arrays, shaped like the results of model.predict()'''
+
+   def __init__(self, model):
+      self.model = model
+      self.input_dtypes = [inp.dtype for inp in model.inputs]
+      input_signature = [tf.TensorSpec(shape=inp.shape, dtype=inp.dtype) for inp in model.inputs]
+
+      @tf.function(input_signature=input_signature)
+      def predict_step(*inputs):
+         inputs = inputs[0] if len(inputs) == 1 else list(inputs)
+         return model(inputs, training=False)
+
+      self.__predict_step = predict_step
+
+   def predict(self, x, batch_size=None):
+      '''Same as model.predict(x), the batch_size is only accepted for compatibility'''
+      inputs = x if isinstance(x, (list, tuple)) else [x]
+      inputs = [tf.convert_to_tensor(np.asarray(inp), dtype=dtype) for inp, dtype in zip(inputs, self.input_dtypes)]
+      outputs = self.__predict_step(*inputs)
+      if isinstance(outputs, (list, tuple)):
+         return [output.numpy() for output in outputs]
+      return outputs.numpy()
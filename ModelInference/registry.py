@@ -0,0 +1,103 @@
+import threading, time
+from collections import OrderedDict
+
+# model states
+LOADING =  'loading'
+READY =    'ready'
+FAILED =   'failed'
+
+class ModelHandle:
+   '''A loaded model (whatever its loader returned) and the lock serializing its use.
+
+   Generators keep state between calls (predictors, incremental engines, random generators),
+   so a model is used by one thread at a time:
+      with handle as model:
+         model.generate(...)'''
+
+   def __init__(self, name, model):
+      self.name = name
+      self.model = model
+      self.lock = threading.Lock()
+
+   def __enter__(self):
+      self.lock.acquire()
+      return self.model
+
+   def __exit__(self, *args):
+      self.lock.release()
+
+class ModelRegistry:
+   '''Loads the models of a server once, at startup, and warms them up.
+
+   Each model is registered with a load function (returning the model) and an optional warm_up
+   function, called once on the loaded model to build and trace the inference graphs before the
+   first real request. start() loads all of them in a background thread, so the server can answer
+   readiness probes meanwhile; get() waits for a model to be ready.'''
+
+   def __init__(self):
+      self.__entries = OrderedDict()
+      self.__lock = threading.Lock()
+      self.__loaded = threading.Event()
+      self.__thread = None
+
+   def register(self, name, load, warm_up=None):
+      '''Adds a model, loaded by load() and then warmed up by warm_up(model)'''
+      with self.__lock:
+         if name in self.__entries:
+            raise Exception(f"Model {name} is already registered")
+         self.__entries[name] = {'load': load, 'warm_up': warm_up, 'status': LOADING, 'handle': None,
+            'error': None, 'load_time': None, 'warm_up_time': None}
+
+   def start(self):
+      '''Loads and warms up all the registered models in a background thread'''
+      with self.__lock:
+         if self.__thread is None:
+            self.__thread = threading.Thread(target=self.load_all, name='model-loader', daemon=True)
+            self.__thread.start()
+
+   def load_all(self):
+      '''Loads and warms up all the registered models, in registration order. A model failing to load
+      is reported by get_status (and get), the others are still loaded'''
+      for name, entry in list(self.__entries.items()):
+         try:
+            start = time.perf_counter()
+            model = entry['load']()
+            entry['load_time'] = time.perf_counter() - start
+            if entry['warm_up'] is not None:
+               start = time.perf_counter()
+               entry['warm_up'](model)
+               entry['warm_up_time'] = time.perf_counter() - start
+            entry['handle'] = ModelHandle(name, model)
+            entry['status'] = READY
+         except Exception as e:
+            entry['error'] = f"{type(e).__name__}: {e}"
+            entry['status'] = FAILED
+      self.__loaded.set()
+
+   def get(self, name, timeout=None):
+      '''Returns the handle of a model, waiting (at most timeout seconds) for the models to be loaded'''
+      entry = self.__entries.get(name)
+      if entry is None:
+         raise Exception(f"Unknown model {name}, expected one of {list(self.__entries)}")
+      if entry['status'] == LOADING:
+         self.start()
+         self.__loaded.wait(timeout)
+      if entry['status'] == FAILED:
+         raise Exception(f"Model {name} could not be loaded: {entry['error']}")
+      if entry['status'] == LOADING:
+         raise Exception(f"Model {name} is still loading")
+      return entry['handle']
+
+   def is_ready(self):
+      '''Determines whether all the models are loaded and warmed up'''
+      return all(entry['status'] == READY for entry in self.__entries.values())
+
+   def get_status(self):
+      '''Returns the state of each model, with its load and warm-up times (seconds) or its error'''
+      status = {}
+      for name, entry in self.__entries.items():
+         status[name] = {'status': entry['status'], 'load_time': entry['load_time'],
+            'warm_up_time': entry['warm_up_time']}
+         if entry['error'] is not None:
+            status[name]['error'] = entry['error']
+      return status
@@ -0,0 +1,102 @@
+import numpy as np
+
+# added to probabilities before taking their log (same value as keras.backend.epsilon())
+EPSILON = 1e-7
+
+
+class Sampler:
+   '''Samples the next token index for a whole batch of predictions at once.
+
+   Rows are sampled with the Gumbel-max trick: the argmax of logits/temperature plus Gumbel
+   noise is distributed like softmax(logits/temperature), so no normalization or multinomial
+   draw is needed. The noise comes from the sampler's own np.random.Generator and is written
+   into a buffer that is reused from one call to the next, so a sampler must not be shared
+   between threads: the generate functions create one per call unless they are given one.
+
+   Indices in excluded_indices (by default 0, the padding index of both models) are never
+   sampled. top_k and top_p (nucleus sampling) restrict the choice to the most likely tokens.
+   A temperature of 0 (or None) picks the most likely token.
+   An optional boolean mask of allowed indices (one, or one per row) restricts the choice
+   further, e.g. to the tokens a grammar accepts.'''
+
+   def __init__(self, top_k=None, top_p=None, excluded_indices=(0,), seed=None):
+      self.top_k = top_k
+      self.top_p = top_p
+      self.excluded_indices = list(excluded_indices)
+      self.rng = np.random.default_rng(seed)
+      # noise buffer, reallocated only when a bigger batch (or another vocabulary size) shows up
+      self.__noise = np.empty((0, 0))
+      # excluded indices mask, by vocabulary size
+      self.__masks = {}
+
+   def sample(self, probs, temperature=1.0, allowed=None):
+      '''Samples from probabilities (softmax outputs): one row, or a batch of rows.
+      temperature is either one value or one value per row.
+      Returns an index for a single row, an array of indices for a batch.'''
+      logits = np.log(np.asarray(probs, dtype=np.float64) + EPSILON)
+      return self.sample_logits(logits, temperature, allowed)
+
+   def sample_logits(self, logits, temperature=1.0, allowed=None):
+      '''Same as sample(), for unnormalized log-probabilities'''
+      logits = np.array(logits, dtype=np.float64)
+      single_row = logits.ndim == 1
+      logits = np.atleast_2d(logits)
+      rows, num_classes = logits.shape
+
+      temperature = np.array([0.0 if t is None else t for t in np.ravel(np.array(temperature, dtype=object))],
+                             dtype=np.float64)
+      temperature = np.broadcast_to(temperature, (rows,))
+      greedy = temperature <= 0
+      logits /= np.where(greedy, 1.0, temperature)[:, None]
+
+      excluded = self.__get_mask(num_classes)
+      logits[:, excluded] = -np.inf
+      if allowed is not None:
+         allowed = np.broadcast_to(allowed, logits.shape)
+         # the excluded indices are never sampled, even when allowed
+         if not np.all(np.any(allowed & ~excluded, axis=1)):
+            raise ValueError("No allowed index to sample from")
+         logits[~allowed] = -np.inf
+      if self.top_k is not None and self.top_k < num_classes:
+         kth_logits = np.partition(logits, -self.top_k, axis=1)[:, -self.top_k]
+         logits[logits < kth_logits[:, None]] = -np.inf
+      if self.top_p is not None and self.top_p < 1.0:
+         self.__apply_top_p(logits)
+
+      noise = self.__get_noise(rows, num_classes)
+      noise[greedy] = 0.0
+      logits += noise
+      indices = np.argmax(logits, axis=1)
+
+      return int(indices[0]) if single_row else indices
+
+   def __apply_top_p(self, logits):
+      '''Keeps, in each row, the smallest set of most likely tokens whose probability reaches top_p'''
+      sorted_logits = -np.sort(-logits, axis=1)
+      probs = np.exp(sorted_logits - sorted_logits[:, :1])
+      probs /= np.sum(probs, axis=1, keepdims=True)
+      # a token is kept if the tokens more likely than it have not reached top_p yet
+      num_kept = np.sum(np.cumsum(probs, axis=1) - probs < self.top_p, axis=1)
+      threshold = sorted_logits[np.arange(logits.shape[0]), num_kept - 1]
+      logits[logits < threshold[:, None]] = -np.inf
+
+   def __get_mask(self, num_classes):
+      mask = self.__masks.get(num_classes)
+      if mask is None:
+         mask = np.zeros(num_classes, dtype=bool)
+         mask[[idx for idx in self.excluded_indices if idx < num_classes]] = True
+         self.__masks[num_classes] = mask
+      return mask
+
+   def __get_noise(self, rows, num_classes):
+      '''Fills the first rows of the buffer with Gumbel noise: -log(-log(U))'''
+      if self.__noise.shape[0] < rows or self.__noise.shape[1] != num_classes:
+         self.__noise = np.empty((rows, num_classes))
+      noise = self.__noise[:rows]
+      self.rng.random(out=noise)
+      with np.errstate(divide='ignore'):
+         np.log(noise, out=noise)
+         np.negative(noise, out=noise)
+         np.log(noise, out=noise)
+      np.negative(noise, out=noise)
+      return noise
@@ -0,0 +1,176 @@
+import threading
+
+import numpy as np
+from tensorflow.keras import backend as K
+from tensorflow.keras.models import Model
+import tqdm
+
+import os, sys
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from ModelInference.predictor import FastPredictor
+from ModelInference.sampler import Sampler
+from Textgenrnn.model import textgenrnn_stateful_model
+from Textgenrnn.utils import (
+   textgenrnn_grammar_states,
+   textgenrnn_grammar_trim,
+   textgenrnn_join_text,
+   textgenrnn_start_text,
+)
+
+
+class textgenrnn_incremental:
+   '''
+   Runs a trained (unidirectional) textgenrnn model one token per step.
+
+   The embedding and LSTM layers run in a stateful copy of the model, so each
+   step only processes the newly added token. The per-position 'rnn_concat'
+   features of the last max_length positions are kept in a cache, and the
+   attention and output layers are applied over that cache in numpy.
+   Attention is a weighted average over positions, so the cache is a ring
+   buffer: positions do not have to be kept in order.
+   An engine holds the state of one generation at a time: lock is held by
+   textgenrnn_generate_incremental while it uses the engine.
+
+   The results are close to, but not the same as, the full model's: the full
+   model restarts its LSTMs on every (left-padded) window, while here the LSTM
+   state carries the whole text, including the padding it started from.
+   '''
+
+   def __init__(self, model, num_classes, cfg, batch_size=1):
+      self.maxlen = cfg['max_length']
+      self.batch_size = batch_size
+      self.lock = threading.Lock()
+      self.features_model = textgenrnn_stateful_model(num_classes, cfg,
+                                                      batch_size)
+      self.features_predictor = FastPredictor(self.features_model)
+      self.sync_weights(model)
+      self.reset()
+
+   def sync_weights(self, model):
+      '''Copies the weights from the trained model (e.g. after loading new weights)'''
+      if len(model.inputs) > 1:
+         model = Model(inputs=model.inputs[0], outputs=model.outputs[1])
+      for layer in self.features_model.layers:
+         if layer.weights:
+            layer.set_weights(model.get_layer(layer.name).get_weights())
+      self.attention_W = model.get_layer('attention').get_weights()[0][:, 0]
+      self.output_W, self.output_b = model.get_layer('output').get_weights()
+
+   def reset(self):
+      '''Clears the LSTM states and the feature cache'''
+      self.features_model.reset_states()
+      num_features = self.features_model.output_shape[-1]
+      self.features = np.zeros((self.batch_size, self.maxlen, num_features),
+                               dtype=np.float32)
+      self.logits = np.zeros((self.batch_size, self.maxlen), dtype=np.float32)
+      # next position to overwrite in the ring buffer
+      self.position = 0
+
+   def start(self, encoded_texts):
+      '''Resets the engine and feeds the starting texts, one row per text.
+      encoded_texts must be left-padded to at least max_length (like
+      textgenrnn_encode_sequences does), so the cache starts out exactly
+      like the window of the full model.
+      Returns the probabilities of the next token.'''
+      self.reset()
+      encoded_texts = np.asarray(encoded_texts)
+      assert encoded_texts.shape[1] >= self.maxlen, "Starting texts must be padded to max_length"
+      features = self.features_predictor.predict(encoded_texts)
+      self.features[:] = features[:, -self.maxlen:, :]
+      self.logits[:] = np.dot(self.features, self.attention_W)
+      return self.__predict()
+
+   def step(self, indices):
+      '''Feeds one token per row and returns the probabilities of the next token'''
+      x = np.asarray(indices).reshape(self.batch_size, 1)
+      features = self.features_predictor.predict(x)[:, 0, :]
+      self.features[:, self.position, :] = features
+      self.logits[:, self.position] = np.dot(features, self.attention_W)
+      self.position = (self.position + 1) % self.maxlen
+      return self.__predict()
+
+   def __predict(self):
+      # same computation as AttentionWeightedAverage + the 'output' Dense layer
+      ai = np.exp(self.logits - np.max(self.logits, axis=-1, keepdims=True))
+      att_weights = ai / (np.sum(ai, axis=1, keepdims=True) + K.epsilon())
+      attention = np.einsum('bt,btf->bf', att_weights, self.features)
+      logits = np.dot(attention, self.output_W) + self.output_b
+      exp_logits = np.exp(logits - np.max(logits, axis=-1, keepdims=True))
+      return exp_logits / np.sum(exp_logits, axis=-1, keepdims=True)
+
+
+def textgenrnn_generate_incremental(engine, vocab,
+                     indices_char, temperature=0.5,
+                     maxlen=40, meta_token='<s>',
+                     word_level=False,
+                     single_text=False,
+                     max_gen_length=300,
+                     prefix=None,
+                     sampler=None,
+                     grammar=None):
+   '''
+   Generates engine.batch_size texts with a textgenrnn_incremental engine.
+   Same arguments and results as textgenrnn_generate_batch.
+   '''
+
+   n = engine.batch_size
+   start_text = textgenrnn_start_text(prefix, maxlen, meta_token,
+                                      word_level, single_text)
+   if single_text:
+      max_gen_length += maxlen
+
+   if not isinstance(temperature, list):
+      temperature = [temperature]
+   if len(temperature) > 0 and isinstance(temperature[0], list):
+      assert len(temperature) == n, "Need one temperature schedule per text."
+      schedules = temperature
+   else:
+      schedules = [temperature] * n
+
+   if sampler is None:
+      sampler = Sampler()
+
+   texts = [list(start_text) for _ in range(n)]
+   ends = [False] * n
+   states = textgenrnn_grammar_states(grammar, n, start_text, word_level,
+                                      single_text)
+
+   with engine.lock:
+      # left-pad the starting text so the cache matches the full model's window
+      encoded = [vocab.get(x, 0) for x in start_text]
+      encoded = [0] * max(0, maxlen - len(encoded)) + encoded
+      preds = engine.start(np.array([encoded] * n))
+
+      iterable = tqdm.trange(max_gen_length)
+      for _ in iterable:
+         if all(ends):
+            break
+         next_temperatures = [schedules[i][(len(texts[i]) - 1) % len(schedules[i])]
+                              for i in range(n)]
+         allowed = None
+         if states:
+            # finished rows are sampled too, they can take any index
+            allowed = np.stack([np.ones(preds.shape[1], dtype=bool) if ends[i]
+                                else states[i].allowed_mask() for i in range(n)])
+         next_indices = sampler.sample(preds, next_temperatures, allowed)
+         for i in range(n):
+            if ends[i]:
+               # finished texts stay in the (fixed size) batch, but are ignored
+               continue
+            text = texts[i]
+            next_char = indices_char[next_indices[i]]
+            text += [next_char]
+            if states:
+               states[i].feed(next_char)
+            if next_char == meta_token or len(text) >= max_gen_length:
+               ends[i] = True
+         if all(ends):
+            break
+         preds = engine.step(next_indices)
+
+   if states:
+      for text, state in zip(texts, states):
+         textgenrnn_grammar_trim(text, state, meta_token)
+   return [(textgenrnn_join_text(text, maxlen, meta_token,
+                                 word_level, single_text), end)
+           for text, end in zip(texts, ends)]
@@ -61,6 +61,35 @@ def textgenrnn_model(num_classes, cfg, context_size=None,
    return model
 
 
+def textgenrnn_stateful_model(num_classes, cfg, batch_size=1):
+   '''
+   Builds an inference-only copy of the textgenrnn layers up to 'rnn_concat',
+   with stateful LSTMs, so that tokens can be fed one at a time.
+   The attention and output layers are not part of this model, they are
+   applied over a cache of the per-position features instead.
+   Weights are copied from a trained model by layer name.
+   '''
+
+   if cfg['rnn_bidirectional']:
+      raise ValueError("Bidirectional models need the whole window at every step and cannot be run incrementally")
+
+   input = Input(batch_shape=(batch_size, None), name='input')
+   embedded = Embedding(num_classes, cfg['dim_embeddings'],
+                        name='embedding')(input)
+
+   rnn_layer_list = []
+   for i in range(cfg['rnn_layers']):
+      prev_layer = embedded if i == 0 else rnn_layer_list[-1]
+      rnn_layer_list.append(LSTM(cfg['rnn_size'],
+                                 return_sequences=True,
+                                 stateful=True,
+                                 recurrent_activation='sigmoid',
+                                 name='rnn_{}'.format(i+1))(prev_layer))
+
+   seq_concat = concatenate([embedded] + rnn_layer_list, name='rnn_concat')
+   return Model(inputs=[input], outputs=[seq_concat])
+
+
 '''
 Create a new LSTM layer per parameters. Unfortunately,
 each combination of parameters must be hardcoded.
@@ -0,0 +1,231 @@
+import threading, time
+from collections import deque
+
+import os, sys
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from ModelInference.sampler import Sampler
+from Textgenrnn.utils import (
+   textgenrnn_generate_step,
+   textgenrnn_grammar_states,
+   textgenrnn_grammar_trim,
+   textgenrnn_join_text,
+   textgenrnn_start_text,
+)
+
+
+class textgenrnn_sequence:
+   '''
+   A text being generated by a textgenrnn_scheduler. done is set once the
+   text (or the error that stopped it) is available. A cancelled text is
+   dropped by the scheduler at its next step.
+   '''
+
+   __slots__ = ['text', 'schedule', 'state', 'decoder', 'max_gen_length',
+                'end', 'result', 'error', 'done', 'cancelled']
+
+   def __init__(self, text, schedule, state, decoder, max_gen_length):
+      self.text = text
+      self.schedule = schedule
+      self.state = state
+      self.decoder = decoder
+      self.max_gen_length = max_gen_length
+      self.end = False
+      self.result = None
+      self.error = None
+      self.done = threading.Event()
+      self.cancelled = False
+
+
+class textgenrnn_scheduler:
+   '''
+   Generates the texts of concurrent callers together, with continuous
+   batching: a single thread moves all the texts being generated forward by
+   one token per step, with one batched prediction. Texts leave the batch as
+   soon as they end and new ones join it at the next step, so concurrent
+   generations share the cost of the forward passes instead of queuing for
+   the model.
+
+   generate() can be called from any number of threads; only the scheduler's
+   thread uses the model. Texts are sampled like textgenrnn_generate_batch
+   samples them (temperature schedules, grammar), with the scheduler's own
+   sampler. A text failing (e.g. a grammar with nothing left to sample)
+   fails alone; the prediction failing fails all the texts of the step.
+   '''
+
+   def __init__(self, textgen, max_batch_size=64, sampler=None):
+      self.model = textgen.get_predictor()
+      self.vocab = textgen.vocab
+      self.indices_char = textgen.indices_char
+      self.meta_token = textgen.META_TOKEN
+      self.maxlen = textgen.config['max_length']
+      self.word_level = textgen.config['word_level']
+      self.single_text = textgen.config.get('single_text', False)
+      self.max_batch_size = max_batch_size
+      self.sampler = sampler if sampler is not None else Sampler()
+      # number of steps run and of texts moved forward, steps / texts is the mean batch size
+      self.num_steps = 0
+      self.num_rows = 0
+
+      self.__pending = deque()
+      self.__condition = threading.Condition()
+      self.__closed = False
+      self.__thread = threading.Thread(target=self.__run,
+                                       name='textgenrnn-scheduler',
+                                       daemon=True)
+      self.__thread.start()
+
+   def submit(self, n=1, temperature=0.5, max_gen_length=300, prefix=None,
+              grammar=None, decoder=None):
+      '''
+      Queues n texts, same arguments as textgenrnn_generate_batch. Returns
+      their textgenrnn_sequence, see generate() to wait for them.
+
+      decoder makes a decoder per text (e.g. CompactBoardStreamDecoder),
+      anything with a feed(chars) method: it is fed the text (after the
+      leading meta token) as it is generated, and a text whose decoder
+      raises fails at once instead of being generated to its end.
+      '''
+
+      start_text = textgenrnn_start_text(prefix, self.maxlen, self.meta_token,
+                                         self.word_level, self.single_text)
+      if self.single_text:
+         max_gen_length += self.maxlen
+
+      if not isinstance(temperature, list):
+         temperature = [temperature]
+      if len(temperature) > 0 and isinstance(temperature[0], list):
+         assert len(temperature) == n, "Need one temperature schedule per text."
+         schedules = temperature
+      else:
+         schedules = [temperature] * n
+
+      states = textgenrnn_grammar_states(grammar, n, start_text,
+                                         self.word_level, self.single_text)
+      decoders = [None] * n
+      if decoder is not None:
+         assert not (self.word_level or self.single_text), \
+            "A decoder needs character level texts starting with the meta token."
+         decoders = [decoder() for _ in range(n)]
+         for text_decoder in decoders:
+            text_decoder.feed(''.join(start_text[1:]))
+      sequences = [textgenrnn_sequence(list(start_text), schedules[i],
+                                       states[i] if states else None,
+                                       decoders[i], max_gen_length)
+                   for i in range(n)]
+      with self.__condition:
+         if self.__closed:
+            raise Exception("The scheduler is closed")
+         self.__pending.extend(sequences)
+         self.__condition.notify()
+      return sequences
+
+   def generate(self, n=1, temperature=0.5, max_gen_length=300, prefix=None,
+                grammar=None, decoder=None, timeout=None, errors=None):
+      '''
+      Generates n texts (see submit) and returns them, as a list of strings.
+      After timeout seconds, the texts not generated yet are cancelled and
+      an exception is raised. A text failing raises its exception, unless
+      an errors list is given: failed texts are then returned as None, and
+      their exceptions added to errors.
+      '''
+
+      sequences = self.submit(n, temperature, max_gen_length, prefix, grammar,
+                              decoder)
+      deadline = time.monotonic() + timeout if timeout is not None else None
+      for sequence in sequences:
+         remaining = max(0, deadline - time.monotonic()) if deadline is not None else None
+         if not sequence.done.wait(remaining):
+            for cancelled in sequences:
+               cancelled.cancelled = True
+            raise Exception("Timed out waiting for the generated text")
+         if sequence.error is not None:
+            if errors is None:
+               raise sequence.error
+            errors.append(sequence.error)
+      return [sequence.result if sequence.error is None else None
+              for sequence in sequences]
+
+   def close(self):
+      '''
+      Stops the scheduler once the queued texts are generated.
+      '''
+
+      with self.__condition:
+         self.__closed = True
+         self.__condition.notify()
+      self.__thread.join()
+
+   def __run(self):
+      active = []
+      while True:
+         with self.__condition:
+            while not self.__pending and not active and not self.__closed:
+               self.__condition.wait()
+            if not self.__pending and not active:
+               return
+            # new texts join the batch at every step, up to max_batch_size
+            while self.__pending and len(active) < self.max_batch_size:
+               sequence = self.__pending.popleft()
+               if not sequence.cancelled:
+                  active.append(sequence)
+
+         # nothing may stop the thread: the callers would wait for their texts forever
+         try:
+            active = self.__step(active)
+         except Exception as e:
+            for sequence in active:
+               self.__fail(sequence, e)
+            active = []
+
+   def __step(self, active):
+      '''
+      Moves the active texts forward by one token, returns the ones still active.
+      '''
+
+      active = [sequence for sequence in active if not sequence.cancelled]
+      if not active:
+         return active
+      errors = []
+      ends = textgenrnn_generate_step(
+         self.model, self.vocab, self.indices_char,
+         [sequence.text for sequence in active],
+         [sequence.schedule for sequence in active],
+         [sequence.state for sequence in active],
+         self.maxlen, self.meta_token,
+         [sequence.max_gen_length for sequence in active],
+         self.sampler, errors)
+      self.num_steps += 1
+      self.num_rows += len(active)
+
+      still_active = []
+      for sequence, end, error in zip(active, ends, errors):
+         if error is None and sequence.decoder is not None:
+            try:
+               sequence.decoder.feed(sequence.text[-1])
+            except Exception as e:
+               error = e
+         if error is not None:
+            self.__fail(sequence, error)
+         elif end:
+            try:
+               self.__finish(sequence)
+            except Exception as e:
+               self.__fail(sequence, e)
+         else:
+            still_active.append(sequence)
+      return still_active
+
+   def __fail(self, sequence, error):
+      if not sequence.done.is_set():
+         sequence.error = error
+         sequence.done.set()
+
+   def __finish(self, sequence):
+      sequence.end = True
+      if sequence.state is not None:
+         textgenrnn_grammar_trim(sequence.text, sequence.state,
+                                 self.meta_token)
+      sequence.result = textgenrnn_join_text(sequence.text, self.maxlen,
+                                             self.meta_token, self.word_level,
+                                             self.single_text)
+      sequence.done.set()
@@ -1,6 +1,6 @@
 import json
 import re
-import os, sys
+import os, sys, threading
 import numpy as np
 import tensorflow as tf
 import tqdm
@@ -18,12 +18,18 @@ from tensorflow.keras.preprocessing.text import Tokenizer, text_to_word_sequence
 
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 from Textgenrnn.model import textgenrnn_model
+from Textgenrnn.incremental import (
+   textgenrnn_generate_incremental,
+   textgenrnn_incremental,
+)
 from Textgenrnn.model_training import generate_sequences_from_texts
 from Textgenrnn.utils import (
    generate_after_epoch,
    save_model_weights,
    textgenrnn_encode_sequence,
    textgenrnn_generate,
+   textgenrnn_generate_batch,
+   textgenrnn_predictor,
    textgenrnn_texts_from_file,
    textgenrnn_texts_from_file_context,
 )
@@ -78,15 +84,65 @@ class textgenrnn:
                                     cfg=self.config,
                                     weights_path=weights_path)
       self.indices_char = dict((self.vocab[c], c) for c in self.vocab)
+      # stateful inference engines, by batch size (see get_incremental_engine)
+      self.incremental_engines = {}
+      self.incremental_engines_lock = threading.Lock()
+      # compiled predictor for self.model (see get_predictor)
+      self.predictor = None
+      self.predictor_model = None
 
    def generate(self, n=1, return_as_list=False, prefix=None,
                temperature=[1.0, 0.5, 0.2, 0.2],
                max_gen_length=300, interactive=False,
-               top_n=3, progress=True):
+               top_n=3, progress=True, batch_size=1, incremental=False,
+               grammar=None):
       gen_texts = []
+      if (batch_size > 1 or incremental) and not interactive:
+         # per-text temperature schedules are split along with the batches
+         per_text = (isinstance(temperature, list) and len(temperature) > 0
+                     and isinstance(temperature[0], list))
+         for start in range(0, n, batch_size):
+            count = min(batch_size, n - start)
+            batch_temperature = (temperature[start:start + count]
+                                 if per_text else temperature)
+            if incremental:
+               results = textgenrnn_generate_incremental(
+                  self.get_incremental_engine(count),
+                  self.vocab,
+                  self.indices_char,
+                  batch_temperature,
+                  self.config['max_length'],
+                  self.META_TOKEN,
+                  self.config['word_level'],
+                  self.config.get('single_text', False),
+                  max_gen_length,
+                  prefix,
+                  grammar=grammar)
+            else:
+               results = textgenrnn_generate_batch(self.get_predictor(),
+                                                   self.vocab,
+                                                   self.indices_char,
+                                                   count,
+                                                   batch_temperature,
+                                                   self.config['max_length'],
+                                                   self.META_TOKEN,
+                                                   self.config['word_level'],
+                                                   self.config.get(
+                                                      'single_text', False),
+                                                   max_gen_length,
+                                                   prefix,
+                                                   grammar=grammar)
+            for gen_text, _ in results:
+               if not return_as_list:
+                  print("{}\n".format(gen_text))
+               gen_texts.append(gen_text)
+         if return_as_list:
+            return gen_texts
+         return
+
       iterable = tqdm.trange(n) if progress and n > 1 else range(n)
       for _ in iterable:
-         gen_text, _ = textgenrnn_generate(self.model,
+         gen_text, _ = textgenrnn_generate(self.get_predictor(),
                                              self.vocab,
                                              self.indices_char,
                                              temperature,
@@ -98,13 +154,37 @@ class textgenrnn:
                                              max_gen_length,
                                              interactive,
                                              top_n,
-                                             prefix)
+                                             prefix,
+                                             grammar=grammar)
          if not return_as_list:
                print("{}\n".format(gen_text))
          gen_texts.append(gen_text)
       if return_as_list:
          return gen_texts
 
+   def get_predictor(self):
+      '''Returns the compiled predictor for the current model, traced once per model'''
+      if self.predictor is None or self.predictor_model is not self.model:
+         self.predictor = textgenrnn_predictor(self.model)
+         self.predictor_model = self.model
+      return self.predictor
+
+   def get_incremental_engine(self, batch_size=1):
+      '''Returns a stateful engine that generates batch_size texts one token per step.
+      Only unidirectional models can be run incrementally.
+      Engines are shared: a generation holds the engine's lock while it runs.'''
+      with self.incremental_engines_lock:
+         engine = self.incremental_engines.get(batch_size)
+         if engine is None:
+            engine = textgenrnn_incremental(self.model, self.num_classes,
+                                            self.config, batch_size)
+            self.incremental_engines[batch_size] = engine
+            return engine
+      # the model may have been retrained or reloaded since
+      with engine.lock:
+         engine.sync_weights(self.model)
+      return engine
+
    def generate_samples(self, n=3, temperatures=[0.2, 0.5, 1.0], **kwargs):
       print("")
       for temperature in temperatures:
@@ -313,6 +393,8 @@ class textgenrnn:
       self.model = textgenrnn_model(self.num_classes,
                                     dropout=dropout,
                                     cfg=self.config)
+      # the architecture may have changed, the engines must be rebuilt
+      self.incremental_engines = {}
 
       # Save the files needed to recreate the model
       with open('{}_vocab.json'.format(self.config['name']),
@@ -10,13 +10,25 @@ from tensorflow.keras.preprocessing import sequence
 from tqdm import trange
 import tqdm
 
+import os, sys
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from ModelInference.predictor import FastPredictor
+from ModelInference.sampler import Sampler
 
-def textgenrnn_sample(preds, temperature, interactive=False, top_n=3):
+
+def textgenrnn_sample(preds, temperature, interactive=False, top_n=3,
+                      sampler=None, allowed=None):
    '''
    Samples predicted probabilities of the next character to allow
    for the network to show "creativity."
    '''
 
+   if not interactive:
+      # the placeholder (index 0) is never chosen, see Sampler
+      if sampler is None:
+         sampler = Sampler()
+      return sampler.sample(preds, temperature, allowed)
+
    preds = np.asarray(preds).astype('float64')
 
    if temperature is None or temperature == 0.0:
@@ -25,19 +37,10 @@ def textgenrnn_sample(preds, temperature, interactive=False, top_n=3):
    preds = np.log(preds + K.epsilon()) / temperature
    exp_preds = np.exp(preds)
    preds = exp_preds / np.sum(exp_preds)
-   probas = np.random.multinomial(1, preds, 1)
 
-   if not interactive:
-      index = np.argmax(probas)
-
-      # prevent function from being able to choose 0 (placeholder)
-      # choose 2nd best index from preds
-      if index == 0:
-         index = np.argsort(preds)[-2]
-   else:
-      # return list of top N chars/words
-      # descending order, based on probability
-      index = (-preds).argsort()[:top_n]
+   # return list of top N chars/words
+   # descending order, based on probability
+   index = (-preds).argsort()[:top_n]
 
    return index
 
@@ -52,7 +55,9 @@ def textgenrnn_generate(model, vocab,
                      top_n=3,
                      prefix=None,
                      synthesize=False,
-                     stop_tokens=[' ', '\n']):
+                     stop_tokens=[' ', '\n'],
+                     sampler=None,
+                     grammar=None):
    '''
    Generates and returns a single text.
    '''
@@ -60,28 +65,19 @@ def textgenrnn_generate(model, vocab,
    collapse_char = ' ' if word_level else ''
    end = False
 
-   # If generating word level, must add spaces around each punctuation.
-   # https://stackoverflow.com/a/3645946/9314418
-   if word_level and prefix:
-      punct = '!"#$%&()*+,-./:;<=>?@[\]^_`{|}~\\n\\t\'‘’“”’–—'
-      prefix = re.sub('([{}])'.format(punct), r' \1 ', prefix)
-      prefix = re.sub(' {2,}', r' ', prefix)
-      prefix_t = [x.lower() for x in prefix.split(' ')]
-
-   if not word_level and prefix:
-      prefix_t = list(prefix)
-
+   text = textgenrnn_start_text(prefix, maxlen, meta_token,
+                                word_level, single_text)
    if single_text:
-      text = prefix_t if prefix else ['']
       max_gen_length += maxlen
-   else:
-      text = [meta_token] + prefix_t if prefix else [meta_token]
 
    if not isinstance(temperature, list):
       temperature = [temperature]
 
-   if len(model.inputs) > 1:
-      model = Model(inputs=model.inputs[0], outputs=model.outputs[1])
+   model = textgenrnn_predictor(model)
+   if sampler is None:
+      sampler = Sampler()
+   states = textgenrnn_grammar_states(grammar, 1, text, word_level,
+                                      single_text, interactive)
 
    iterable = tqdm.trange(max_gen_length)
    for _ in iterable:
@@ -96,9 +92,12 @@ def textgenrnn_generate(model, vocab,
          # auto-generate text without user intervention
          next_index = textgenrnn_sample(
                model.predict(encoded_text, batch_size=1)[0],
-               next_temperature)
+               next_temperature, sampler=sampler,
+               allowed=states[0].allowed_mask() if states else None)
          next_char = indices_char[next_index]
          text += [next_char]
+         if states:
+               states[0].feed(next_char)
          if next_char == meta_token or len(text) >= max_gen_length:
                end = True
          gen_break = (next_char in stop_tokens or word_level or
@@ -143,6 +142,224 @@ def textgenrnn_generate(model, vocab,
                else:
                   print('That\'s not an option!')
    
+   if states:
+      textgenrnn_grammar_trim(text, states[0], meta_token)
+   text_joined = textgenrnn_join_text(text, maxlen, meta_token,
+                                      word_level, single_text)
+
+   return text_joined, end
+
+
+def textgenrnn_generate_batch(model, vocab,
+                     indices_char, n=1, temperature=0.5,
+                     maxlen=40, meta_token='<s>',
+                     word_level=False,
+                     single_text=False,
+                     max_gen_length=300,
+                     prefix=None,
+                     sampler=None,
+                     grammar=None):
+   '''
+   Generates n texts at once, moving all of them forward with a single
+   batched prediction per step. Each text samples with its own temperature
+   schedule and leaves the batch as soon as it emits the meta_token.
+
+   temperature can be a number, a schedule (list) shared by all texts, or
+   a list of n schedules, one per text.
+   With a grammar (e.g. CompactBoardGrammar), only the characters the
+   grammar accepts are sampled, see textgenrnn_grammar_states.
+   Returns a list of (text, end) tuples, one per generated text.
+   '''
+
+   start_text = textgenrnn_start_text(prefix, maxlen, meta_token,
+                                      word_level, single_text)
+   if single_text:
+      max_gen_length += maxlen
+
+   if not isinstance(temperature, list):
+      temperature = [temperature]
+   if len(temperature) > 0 and isinstance(temperature[0], list):
+      assert len(temperature) == n, "Need one temperature schedule per text."
+      schedules = temperature
+   else:
+      schedules = [temperature] * n
+
+   model = textgenrnn_predictor(model)
+   if sampler is None:
+      sampler = Sampler()
+
+   texts = [list(start_text) for _ in range(n)]
+   ends = [False] * n
+   states = textgenrnn_grammar_states(grammar, n, start_text, word_level,
+                                      single_text)
+   # indices of the texts still being generated
+   active = list(range(n))
+
+   iterable = tqdm.trange(max_gen_length)
+   for _ in iterable:
+      if len(active) == 0:
+         break
+      step_ends = textgenrnn_generate_step(
+         model, vocab, indices_char,
+         [texts[i] for i in active],
+         [schedules[i] for i in active],
+         [states[i] for i in active] if states else None,
+         maxlen, meta_token, [max_gen_length] * len(active), sampler)
+
+      still_active = []
+      for i, end in zip(active, step_ends):
+         if end:
+            ends[i] = True
+         else:
+            still_active.append(i)
+      active = still_active
+
+   results = []
+   for i, (text, end) in enumerate(zip(texts, ends)):
+      if states:
+         textgenrnn_grammar_trim(text, states[i], meta_token)
+      results.append((textgenrnn_join_text(text, maxlen, meta_token,
+                                           word_level, single_text), end))
+
+   return results
+
+
+def textgenrnn_generate_step(model, vocab, indices_char, texts, schedules,
+                             states, maxlen, meta_token, max_gen_lengths,
+                             sampler, errors=None):
+   '''
+   Moves each of the texts forward by one token, with a single batched
+   prediction. schedules are the temperature schedules of the texts and
+   states their grammar states (None for the texts without a grammar, or
+   instead of the whole list). Texts end on the meta_token or when they
+   reach their max_gen_lengths. Returns, for each text, whether it ended.
+
+   A text failing (nothing left to sample, or a character its grammar
+   rejects) fails the whole step, unless an errors list is given: it then
+   receives, for each text, its exception (or None), and failed texts end.
+   '''
+
+   encoded_texts = textgenrnn_encode_sequences(
+      [text[-maxlen:] for text in texts], vocab, maxlen)
+   preds = model.predict(encoded_texts, batch_size=len(texts))
+
+   # all the texts are sampled at once, each with its own temperature
+   next_temperatures = [schedule[(len(text) - 1) % len(schedule)]
+                        for text, schedule in zip(texts, schedules)]
+   allowed = None
+   if states and any(state is not None for state in states):
+      allowed = np.ones(preds.shape, dtype=bool)
+      for row, state in enumerate(states):
+         if state is not None:
+            allowed[row] = state.allowed_mask()
+   row_errors = [None] * len(texts)
+   try:
+      next_indices = sampler.sample(preds, next_temperatures, allowed)
+   except ValueError:
+      if errors is None:
+         raise
+      # samples the rows one at a time, to find the ones that fail
+      next_indices = [None] * len(texts)
+      for row in range(len(texts)):
+         try:
+            next_indices[row] = sampler.sample(
+               preds[row], next_temperatures[row],
+               allowed[row] if allowed is not None else None)
+         except ValueError as e:
+            row_errors[row] = e
+
+   ends = []
+   for row, text in enumerate(texts):
+      if row_errors[row] is None:
+         next_char = indices_char[next_indices[row]]
+         text += [next_char]
+         try:
+            if states and states[row] is not None:
+               states[row].feed(next_char)
+         except Exception as e:
+            if errors is None:
+               raise
+            row_errors[row] = e
+      ends.append(row_errors[row] is not None
+                  or next_char == meta_token
+                  or len(text) >= max_gen_lengths[row])
+   if errors is not None:
+      errors.extend(row_errors)
+   return ends
+
+
+def textgenrnn_predictor(model):
+   '''
+   Returns a FastPredictor for the text-only part of the model. Predictors
+   are passed through, so callers can build one once and reuse it.
+   '''
+
+   if isinstance(model, FastPredictor):
+      return model
+   if len(model.inputs) > 1:
+      model = Model(inputs=model.inputs[0], outputs=model.outputs[1])
+   return FastPredictor(model)
+
+
+def textgenrnn_grammar_states(grammar, n, start_text, word_level=False,
+                              single_text=False, interactive=False):
+   '''
+   Returns the grammar states of n texts starting with start_text, or None
+   without a grammar. A grammar reads the characters of the text that
+   follow the leading meta_token (the prefix must follow the grammar too):
+   its state's allowed_mask() tells which vocabulary indices can come next.
+   '''
+
+   if grammar is None:
+      return None
+   assert not (word_level or single_text or interactive), \
+      "A grammar needs character level texts starting with the meta token."
+   states = [grammar.new_state() for _ in range(n)]
+   for state in states:
+      state.feed_text(start_text[1:])
+   return states
+
+
+def textgenrnn_grammar_trim(text, state, meta_token):
+   '''
+   Cuts a text that ran out of length before its meta_token back to the
+   last point where its grammar state could end.
+   '''
+
+   if text[-1] != meta_token:
+      del text[1 + state.complete_length:]
+
+
+def textgenrnn_start_text(prefix, maxlen, meta_token,
+                          word_level=False, single_text=False):
+   '''
+   Returns the list of tokens a generated text starts from.
+   '''
+
+   # If generating word level, must add spaces around each punctuation.
+   # https://stackoverflow.com/a/3645946/9314418
+   if word_level and prefix:
+      punct = '!"#$%&()*+,-./:;<=>?@[\]^_`{|}~\\n\\t\'‘’“”’–—'
+      prefix = re.sub('([{}])'.format(punct), r' \1 ', prefix)
+      prefix = re.sub(' {2,}', r' ', prefix)
+      prefix_t = [x.lower() for x in prefix.split(' ')]
+
+   if not word_level and prefix:
+      prefix_t = list(prefix)
+
+   if single_text:
+      return prefix_t if prefix else ['']
+   return [meta_token] + prefix_t if prefix else [meta_token]
+
+
+def textgenrnn_join_text(text, maxlen, meta_token,
+                         word_level=False, single_text=False):
+   '''
+   Joins the tokens of a generated text into the final string.
+   '''
+
+   collapse_char = ' ' if word_level else ''
+
    # if single text, ignore sequences generated w/ padding
    # if not single text, remove the <s> meta_tokens
    if single_text:
@@ -166,10 +383,10 @@ def textgenrnn_generate(model, vocab,
          left_punct), r'\1', text_joined)
       text_joined = re.sub("([{}]) ".format(
          right_punct), r'\1', text_joined)
-      text_joined = re.sub('" (.+?) "', 
+      text_joined = re.sub('" (.+?) "',
          r'"\1"', text_joined)
 
-   return text_joined, end
+   return text_joined
 
 
 def textgenrnn_encode_sequence(text, vocab, maxlen):
@@ -182,6 +399,16 @@ def textgenrnn_encode_sequence(text, vocab, maxlen):
    return sequence.pad_sequences([encoded], maxlen=maxlen)
 
 
+def textgenrnn_encode_sequences(texts, vocab, maxlen):
+   '''
+   Encodes a list of texts into one padded batch for prediction with
+   the model.
+   '''
+
+   encoded = [np.array([vocab.get(x, 0) for x in text]) for text in texts]
+   return sequence.pad_sequences(encoded, maxlen=maxlen)
+
+
 def textgenrnn_texts_from_file(file_path, header=True,
                               delim='\n', is_csv=False):
    '''
@@ -251,7 +478,7 @@ def synthesize(textgens, n=1, return_as_list=False, prefix='',
       textgen_i = 0
       while not end:
          textgen = textgens[textgen_i % len(textgens)]
-         gen_text, end = textgenrnn_generate(textgen.model,
+         gen_text, end = textgenrnn_generate(textgen.get_predictor(),
                                              textgen.vocab,
                                              textgen.indices_char,
                                              temperature,
@@ -0,0 +1,106 @@
+import threading, time
+from collections import deque
+
+class BoardPool:
+   '''A stock of boards made in advance, so requests that do not depend on any input are served at once.
+
+   produce() makes one board (whatever it returns is stored, e.g. the paths of the board and of its
+   image). A background thread fills the pool up to capacity; once pop() brings it down to
+   low_watermark boards, it fills it again. When produce() fails, the thread backs off before
+   trying again: retry_delay seconds, doubled after each failure in a row up to max_retry_delay,
+   so a producer that keeps failing does not keep competing with the requests for the model.
+   pop() never waits: without a board in stock, it returns None and the caller makes its own
+   (a miss).'''
+
+   def __init__(self, produce, capacity=8, low_watermark=2, retry_delay=30, max_retry_delay=30*60):
+      self.produce = produce
+      self.capacity = capacity
+      self.low_watermark = low_watermark
+      self.retry_delay = retry_delay
+      self.max_retry_delay = max_retry_delay
+      self.hits = 0
+      self.misses = 0
+      self.num_produced = 0
+      self.num_failures = 0
+      self.consecutive_failures = 0
+      self.__boards = deque()
+      self.__condition = threading.Condition()
+      self.__closed = False
+      self.__filling = False
+      # time.monotonic() of the next try after a failure, None when not backing off
+      self.__retry_at = None
+      self.__thread = None
+
+   def start(self):
+      '''Starts filling the pool in the background'''
+      with self.__condition:
+         if self.__thread is None:
+            self.__thread = threading.Thread(target=self.__refill, name='board-pool', daemon=True)
+            self.__thread.start()
+
+   def pop(self):
+      '''Returns a board from the pool, None if the pool is empty'''
+      with self.__condition:
+         if not self.__boards:
+            self.misses += 1
+            return None
+         self.hits += 1
+         board = self.__boards.popleft()
+         if len(self.__boards) <= self.low_watermark:
+            self.__condition.notify()
+         return board
+
+   def get_stats(self):
+      with self.__condition:
+         requests = self.hits + self.misses
+         if self.__closed:
+            state = 'closed'
+         elif self.__retry_at is not None:
+            state = 'backing off'
+         else:
+            state = 'filling' if self.__filling else 'idle'
+         retry_in = max(0, self.__retry_at - time.monotonic()) if self.__retry_at is not None else None
+         return {'size': len(self.__boards), 'capacity': self.capacity, 'low_watermark': self.low_watermark,
+            'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / requests if requests > 0 else None,
+            'produced': self.num_produced, 'failures': self.num_failures, 'state': state,
+            'consecutive_failures': self.consecutive_failures, 'retry_in': retry_in}
+
+   def get_retry_delay(self):
+      '''Seconds to wait after the current run of consecutive failures'''
+      return min(self.retry_delay * 2 ** max(0, self.consecutive_failures - 1), self.max_retry_delay)
+
+   def close(self):
+      with self.__condition:
+         self.__closed = True
+         self.__condition.notify()
+
+   def __refill(self):
+      while True:
+         with self.__condition:
+            # sleeps while the pool is above its low watermark, then fills it up to capacity
+            self.__filling = False
+            while not self.__closed and len(self.__boards) > self.low_watermark:
+               self.__condition.wait()
+            if self.__closed:
+               return
+            self.__filling = True
+         while not self.__closed and len(self.__boards) < self.capacity:
+            try:
+               board = self.produce()
+            except Exception as e:
+               with self.__condition:
+                  self.num_failures += 1
+                  self.consecutive_failures += 1
+                  delay = self.get_retry_delay()
+                  print(f"Board pool could not produce a board ({self.consecutive_failures} failures in a row), "
+                        f"retrying in {delay} s:", e)
+                  # pop() notifications do not cut the back-off short, close() does
+                  self.__retry_at = time.monotonic() + delay
+                  while not self.__closed and time.monotonic() < self.__retry_at:
+                     self.__condition.wait(self.__retry_at - time.monotonic())
+                  self.__retry_at = None
+               continue
+            with self.__condition:
+               self.__boards.append(board)
+               self.num_produced += 1
+               self.consecutive_failures = 0
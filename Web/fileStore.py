@@ -0,0 +1,108 @@
+import os, re, threading, time, uuid
+
+# names of the files a FileStore manages: a uuid, then anything (e.g. '_upload.brd', '.png')
+MANAGED_NAME = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}')
+
+class FileStore:
+   '''The files the Web app keeps for its users (uploads, generated boards and their images) in a folder.
+
+   A background sweeper removes them ttl seconds after they were written (or last touched), and,
+   when the folder holds more than max_bytes, the oldest ones first. Only files named by new_name
+   (starting with a uuid) are managed, so other files in the folder (e.g. sample boards) are never
+   removed; neither are pinned files (e.g. boards waiting in a pool to be served).'''
+
+   def __init__(self, folder, ttl=3600, max_bytes=512*1024*1024, sweep_interval=300):
+      self.folder = folder
+      self.ttl = ttl
+      self.max_bytes = max_bytes
+      self.sweep_interval = sweep_interval
+      self.num_removed = 0
+      self.bytes_removed = 0
+      os.makedirs(folder, exist_ok=True)
+      self.__pinned = set()
+      self.__lock = threading.Lock()
+      self.__stop = threading.Event()
+      self.__thread = None
+
+   def new_name(self, suffix=''):
+      '''Returns a new (managed) file name ending with suffix'''
+      return f"{str(uuid.uuid4())}{suffix}"
+
+   def get_path(self, name):
+      '''Returns the path of the file name. Names come from the clients: a ValueError is raised unless
+      name is a plain file name, either a managed one or the name of a file already in the folder'''
+      if not isinstance(name, str) or name in ('', '.', '..') or os.path.basename(name) != name:
+         raise ValueError(f"Invalid file name {name!r}")
+      path = os.path.join(self.folder, name)
+      if not MANAGED_NAME.match(name) and not os.path.isfile(path):
+         raise ValueError(f"Invalid file name {name!r}")
+      return path
+
+   def touch(self, name):
+      '''Restarts the ttl of a file, e.g. when a user gets back to it (raises a ValueError, see get_path)'''
+      try:
+         os.utime(self.get_path(name))
+      except FileNotFoundError:
+         pass
+
+   def pin(self, name):
+      '''Keeps a file from being removed, until unpin'''
+      with self.__lock:
+         self.__pinned.add(name)
+
+   def unpin(self, name):
+      with self.__lock:
+         self.__pinned.discard(name)
+
+   def start(self):
+      '''Starts sweeping the folder every sweep_interval seconds'''
+      if self.__thread is None:
+         self.__thread = threading.Thread(target=self.__run, name='file-sweeper', daemon=True)
+         self.__thread.start()
+
+   def close(self):
+      self.__stop.set()
+
+   def sweep(self):
+      '''Removes the expired files, then the oldest ones while the folder is over max_bytes.
+      Returns the number of files removed and the bytes freed'''
+      with self.__lock:
+         pinned = set(self.__pinned)
+      files = []
+      for entry in os.scandir(self.folder):
+         if entry.is_file() and MANAGED_NAME.match(entry.name) and entry.name not in pinned:
+            try:
+               stat = entry.stat()
+            except FileNotFoundError:
+               continue
+            files.append((stat.st_mtime, stat.st_size, entry.name))
+      files.sort()
+
+      now = time.time()
+      total_bytes = sum(size for _, size, _ in files)
+      num_removed, bytes_removed = 0, 0
+      for mtime, size, name in files:
+         if now - mtime <= self.ttl and total_bytes <= self.max_bytes:
+            break
+         try:
+            os.remove(self.get_path(name))
+         except FileNotFoundError:
+            pass
+         total_bytes -= size
+         num_removed += 1
+         bytes_removed += size
+      self.num_removed += num_removed
+      self.bytes_removed += bytes_removed
+      return num_removed, bytes_removed
+
+   def __run(self):
+      # the first sweep removes what earlier runs of the server left behind
+      while True:
+         try:
+            num_removed, bytes_removed = self.sweep()
+            if num_removed > 0:
+               print(f"Removed {num_removed} files ({bytes_removed/1e6:.1f} MB) from {self.folder}")
+         except Exception as e:
+            print("Could not sweep", self.folder, e)
+         if self.__stop.wait(self.sweep_interval):
+            return
@@ -0,0 +1,86 @@
+import threading, time, uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# job states
+QUEUED =   'queued'
+RUNNING =  'running'
+DONE =     'done'
+FAILED =   'failed'
+
+class QueueFullError(Exception):
+   '''Raised by JobQueue.submit when max_pending jobs are already queued or running'''
+   pass
+
+class Job:
+   '''A function call run by a JobQueue, and its outcome'''
+   __slots__ = ['id', 'status', 'result', 'error', 'submitted', 'finished']
+
+   def __init__(self):
+      self.id = str(uuid.uuid4())
+      self.status = QUEUED
+      self.result = None
+      self.error = None
+      self.submitted = time.time()
+      self.finished = None
+
+class JobQueue:
+   '''Runs functions (e.g. board generations) in a pool of background threads.
+
+   submit returns a job id straight away, the caller polls the job with get. At most max_pending jobs
+   are queued or running: further submissions are refused (QueueFullError) instead of piling up
+   requests that would time out. Finished jobs are kept result_ttl seconds for their results to be
+   collected.'''
+
+   def __init__(self, workers=1, max_pending=8, result_ttl=600):
+      self.max_pending = max_pending
+      self.result_ttl = result_ttl
+      self.__executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+      self.__jobs = OrderedDict()
+      self.__lock = threading.Lock()
+
+   def submit(self, function, *args, **kwargs):
+      '''Queues function(*args, **kwargs) and returns the id of its job'''
+      with self.__lock:
+         self.__remove_expired_jobs()
+         if self.get_num_pending() >= self.max_pending:
+            raise QueueFullError(f"{self.max_pending} jobs are already pending")
+         job = Job()
+         self.__jobs[job.id] = job
+      self.__executor.submit(self.__run, job, function, args, kwargs)
+      return job.id
+
+   def get(self, job_id):
+      '''Returns the job with the given id, None if there is no such job (or it expired)'''
+      with self.__lock:
+         return self.__jobs.get(job_id)
+
+   def get_position(self, job):
+      '''Returns the number of jobs queued before a queued job (0 once it runs)'''
+      with self.__lock:
+         if job.status != QUEUED:
+            return 0
+         return sum(1 for other in self.__jobs.values() if other.status == QUEUED and other.submitted < job.submitted)
+
+   def get_num_pending(self):
+      return sum(1 for job in self.__jobs.values() if job.status in (QUEUED, RUNNING))
+
+   def shutdown(self):
+      self.__executor.shutdown()
+
+   def __run(self, job, function, args, kwargs):
+      job.status = RUNNING
+      try:
+         job.result = function(*args, **kwargs)
+         job.status = DONE
+      except Exception as e:
+         job.error = str(e)
+         job.status = FAILED
+      job.finished = time.time()
+
+   def __remove_expired_jobs(self):
+      now = time.time()
+      expired = [job_id for job_id, job in self.__jobs.items()
+         if job.finished is not None and now - job.finished > self.result_ttl]
+      for job_id in expired:
+         del self.__jobs[job_id]
@@ -14,13 +14,40 @@ from flask.helpers import send_from_directory
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 from BoardOperations import render, brdFile
 from BoardTokenize.CompactBoardTokenizer import CompactBoardTokenizer
-from BoardTokenize.TreeBoardTokenizer import TreeBoardTokenizer
+from BoardTokenize.CompactBoardGrammar import CompactBoardGrammar
+from BoardTokenize.CompactBoardStreamDecoder import CompactBoardStreamDecoder
 from Textgenrnn import textgenrnn
+from Textgenrnn.scheduler import textgenrnn_scheduler
+from ModelInference.registry import ModelRegistry
+from jobQueue import JobQueue, QueueFullError, DONE, FAILED
+from boardPool import BoardPool
+from fileStore import FileStore
 
 app = Flask(__name__)
 
 # load the ML model
 TEMP_FILES_FOLDER = "static/files"
+# uploads, generated boards and their images are removed FILES_TTL seconds after their last use,
+# or earlier (oldest first) when the folder grows over FILES_MAX_BYTES
+FILES_TTL = 3600
+FILES_MAX_BYTES = 512*1024*1024
+files = FileStore(TEMP_FILES_FOLDER, ttl=FILES_TTL, max_bytes=FILES_MAX_BYTES)
+files.start()
+# how many boards to generate at once for each request (the first valid one is returned)
+# generation follows the CompactBoardGrammar, so the first candidate always decodes
+NUM_CANDIDATE_BOARDS = 1
+# generations run in GENERATION_WORKERS background threads, the scheduler of the model batches their
+# tokens together; at most MAX_PENDING_JOBS are queued or running, further requests are answered
+# with 429 until some finish
+GENERATION_WORKERS = 8
+MAX_PENDING_JOBS = 32
+# seconds a client should wait before submitting again when the queue is full
+RETRY_AFTER = 10
+jobs = JobQueue(workers=GENERATION_WORKERS, max_pending=MAX_PENDING_JOBS)
+# new boards (no uploaded board to complete) are served from a pool of boards generated and rendered
+# in advance, refilled up to POOL_CAPACITY once only POOL_LOW_WATERMARK are left
+POOL_CAPACITY = 8
+POOL_LOW_WATERMARK = 2
 
 @app.route("/")
 def main_page():
@@ -29,9 +56,11 @@ def main_page():
 @app.route("/sendfile", methods=["POST"])
 def send_file():
    fileob = request.files["file2upload"]
-   guid = uuid.uuid4()
-   filename = f"{str(guid)}_{fileob.filename}"
-   save_path = f"{TEMP_FILES_FOLDER}/{filename}"
+   filename = files.new_name(f"_{fileob.filename}")
+   try:
+      save_path = files.get_path(filename)
+   except ValueError:
+      return Response("Invalid file name", status=400, mimetype='text/plain')
    fileob.save(save_path)
 
    response = {'path': filename}
@@ -42,54 +71,103 @@ def render_board_file():
    jsonData = request.get_json()
    fileName = jsonData['fileName']
    print("Filename:", fileName)
-   base = os.path.splitext(fileName)[0]
-   output_png = os.path.join(TEMP_FILES_FOLDER, base+".png")
+   try:
+      files.touch(fileName)
+   except ValueError:
+      return Response("Invalid file name", status=400, mimetype='text/plain')
 
    try:
-      root = brdFile.read_board_root(os.path.join(TEMP_FILES_FOLDER, fileName))
-      svgString = render.convertCondensedBoardToSvgString(root)
-      render.convertSvgStringToPng(svgString, output_png)
+      output_png = render_board(fileName)
    except:
       return Response("Error in rendering the generated board", status=500, mimetype='text/plain')
 
    response = {'path': output_png}
    return jsonify(response)
 
+def render_board(fileName):
+   '''Renders the board fileName (in TEMP_FILES_FOLDER) into a PNG next to it, returns the PNG path'''
+   board_path = files.get_path(fileName)
+   output_png = os.path.splitext(board_path)[0] + ".png"
+   root = brdFile.read_board_root(board_path)
+   svgString = render.convertCondensedBoardToSvgString(root)
+   render.convertSvgStringToPng(svgString, output_png)
+   return output_png
+
 @app.route("/generateboard", methods=["GET"])
 def generate_board_file():
-   try:
-      board_file = generate_board()
-   except:
-      return Response("Error in generating a board", status=500, mimetype='text/plain')   
+   # a board from the pool is already rendered: answer with both paths, no job needed
+   board = board_pool.pop()
+   if board is not None:
+      # the board leaves the pool: from now on it expires like the other files
+      for path in [board['path'], board['png']]:
+         name = os.path.basename(path)
+         files.unpin(name)
+         files.touch(name)
+      return jsonify(board)
+   return submit_job(generate_board)
 
-   response = {'path': board_file}
-   return jsonify(response)
+@app.route("/pool", methods=["GET"])
+def get_pool_stats():
+   return jsonify(board_pool.get_stats())
 
 @app.route("/completeboard", methods=["POST"])
 def suggest_board_completion():
    jsonData = request.get_json()
    fileName = jsonData['fileName']
    print("Filename:", fileName)
+   try:
+      files.get_path(fileName)
+   except ValueError:
+      return Response("Invalid file name", status=400, mimetype='text/plain')
+   return submit_job(complete_board, fileName)
 
-   board_root = brdFile.read_board_root(os.path.join(TEMP_FILES_FOLDER, fileName))
-   board_root = brdFile.getCondensedBoardFromEagle(board_root, flatten_board=True)
-   
-   tokenizer = TreeBoardTokenizer()
-   prefix_tokens = tokenizer.BoardToTokenString(board_root)
-
+def submit_job(function, *args):
+   '''Queues a board generation, answers with the id of its job (or 429 when the queue is full)'''
    try:
-      board_file = generate_board(prefix=prefix_tokens)
-   except:
-      return Response("Error in completing the suggested board", status=500, mimetype='text/plain')
-   response = {'path': board_file}
+      job_id = jobs.submit(function, *args)
+   except QueueFullError:
+      return Response("The server is busy generating other boards, please try again in a moment", status=429,
+         mimetype='text/plain', headers={'Retry-After': str(RETRY_AFTER)})
+   return jsonify({'jobId': job_id}), 202
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_job_status(job_id):
+   job = jobs.get(job_id)
+   if job is None:
+      return Response("Unknown job", status=404, mimetype='text/plain')
+   response = {'jobId': job.id, 'status': job.status, 'position': jobs.get_position(job)}
+   if job.status == FAILED:
+      response['error'] = job.error
    return jsonify(response)
 
+@app.route("/jobs/<job_id>/result", methods=["GET"])
+def get_job_result(job_id):
+   job = jobs.get(job_id)
+   if job is None:
+      return Response("Unknown job", status=404, mimetype='text/plain')
+   if job.status == FAILED:
+      return Response(f"Error in generating the board: {job.error}", status=500, mimetype='text/plain')
+   if job.status != DONE:
+      return Response("The board is not generated yet", status=409, mimetype='text/plain')
+   response = {'path': job.result}
+   return jsonify(response)
+
+@app.route("/ready", methods=["GET"])
+def get_readiness():
+   '''503 until all the models are loaded and warmed up, 200 after'''
+   response = {'ready': models.is_ready(), 'models': models.get_status()}
+   return jsonify(response), 200 if response['ready'] else 503
+
 @app.route("/downloadfile", methods=["POST"])
 def download_file():
    bytesData = request.get_data()   
    my_json = bytesData.decode('utf8').replace("'", '"')
    jsonData = json.loads(my_json)
    fileName = jsonData['fileName']
+   try:
+      files.touch(fileName)
+   except ValueError:
+      return Response("Invalid file name", status=400, mimetype='text/plain')
 
    fileFolder = os.path.join(current_app.root_path, TEMP_FILES_FOLDER)
    return send_from_directory(directory=fileFolder, filename=fileName, as_attachment=True)
@@ -98,12 +176,20 @@ def download_file():
 ############### ML Model operations
 ############################################################################
 
-# the actual object that will do the completion
-textgen = None
+# the models of the server, loaded and warmed up in the background as soon as the server starts
+models = ModelRegistry()
+# a GPT Mini model (folder under models/) to load as well, e.g. to compare it with textgenrnn; none by default
+GPT_MINI_MODEL = os.environ.get('GPT_MINI_MODEL')
+# tokens generated by the warm-up of a model, enough to trace all its inference graphs
+WARM_UP_TOKENS = 8
+# seconds a generation waits for the models to be loaded
+MODEL_WAIT_TIMEOUT = 600
+# seconds a generation waits for its boards, once the model is loaded
+GENERATION_TIMEOUT = 600
 
-def init_ml_model():
-   global textgen
-   print("\n\n creating object \n\n")
+def load_textgenrnn():
+   '''Returns the textgenrnn model, the grammar that constrains the generated characters to the ones
+   that keep the board decodable, and the scheduler generating the boards of concurrent requests together'''
    parent_folder = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
    textgenrnn_folder = os.path.join(parent_folder, "Textgenrnn")
    config_file = os.path.join(textgenrnn_folder, "eagleCompact128bi_config.json")
@@ -115,41 +201,97 @@ def init_ml_model():
                         config_path=config_file,
                         vocab_path=vocab_file)
    textgen.META_TOKEN = '|'
-   
-def generate_board(prefix=None):
-   global textgen
-   # lazy initialization TODO: figure out how to initialize when server starts
-   if textgen is None:
-      init_ml_model()
+   board_grammar = CompactBoardGrammar(textgen.vocab)
+   scheduler = textgenrnn_scheduler(textgen, max_batch_size=GENERATION_WORKERS * NUM_CANDIDATE_BOARDS)
+   return textgen, board_grammar, scheduler
+
+def warm_up_textgenrnn(model):
+   # same call as generate_board, so the graphs traced here are the ones requests use
+   textgen, board_grammar, scheduler = model
+   scheduler.generate(n=NUM_CANDIDATE_BOARDS, max_gen_length=WARM_UP_TOKENS,
+                      temperature=[[0.5] for _ in range(NUM_CANDIDATE_BOARDS)], prefix='D B N ', grammar=board_grammar)
+
+def load_gpt_mini():
+   sys.path.append(os.path.join(os.path.dirname(__file__), "..", "GPT_Mini"))
+   from gpt_predict import GptTextGenerator
+   return GptTextGenerator(GPT_MINI_MODEL)
+
+def warm_up_gpt_mini(generator):
+   generator.generate('D B N ', max_tokens_to_generate=WARM_UP_TOKENS)
+
+models.register('textgenrnn', load_textgenrnn, warm_up_textgenrnn)
+if GPT_MINI_MODEL:
+   models.register('gpt_mini', load_gpt_mini, warm_up_gpt_mini)
+models.start()
+
+def produce_pooled_board():
+   '''Generates and renders a new board for the pool, returns the paths of the board and of its PNG'''
+   board_file = generate_board()
+   # pinned before rendering, so the board cannot expire while it waits in the pool
+   files.pin(board_file)
+   try:
+      png_file = render_board(board_file)
+   except Exception:
+      files.unpin(board_file)
+      raise
+   files.pin(os.path.basename(png_file))
+   return {'path': board_file, 'png': png_file}
+
+board_pool = BoardPool(produce_pooled_board, capacity=POOL_CAPACITY, low_watermark=POOL_LOW_WATERMARK)
+board_pool.start()
 
+def complete_board(fileName):
+   '''Generates a board continuing the (uploaded) board fileName, returns the generated board file'''
+   board_root = brdFile.read_board_root(files.get_path(fileName))
+   board_root = brdFile.getCondensedBoardFromEagle(board_root, flatten_board=True)
+
+   # the model was trained on the compact encoding; the generated text continues the board, so it does not end yet
+   tokenizer = CompactBoardTokenizer()
+   prefix_tokens = tokenizer.BoardToTokenString(board_root)
+   prefix_tokens = prefix_tokens[:-len(tokenizer._END_OF_BOARD)] + tokenizer._WORD_SEPARATOR
+   return generate_board(prefix=prefix_tokens)
+
+def generate_board(prefix=None):
    if prefix is None:
       # encoding for the beginning of each board's XML <drawing> <board> <plain> ... </plain> ... </board> </drawing>
       prefix = 'D B N '   
 
-   guid = uuid.uuid4()
-   tokens_file_name = f"{str(guid)}.tokens"
-   board_file_name = os.path.splitext(tokens_file_name)[0]+".brd"
-   tokens_file_path = os.path.join(TEMP_FILES_FOLDER, tokens_file_name)
-   board_file_path = os.path.join(TEMP_FILES_FOLDER, board_file_name)
+   board_file_name = files.new_name(".brd")
+   board_file_path = files.get_path(board_file_name)
 
    # TODO: this should be a parameter sent from the UI, for now random in the interval (0.25, 0.35).
    #       at higher temperatures, the chances of an incorrect board increase
-   random_temperature = 0.25 + random.random()
-   temperature = [random_temperature]
+   # each candidate gets its own random temperature
+   temperature = [[0.25 + 0.1 * random.random()] for _ in range(NUM_CANDIDATE_BOARDS)]
 
    # TODO: how many tokens to generate (unless '|' is generated) should be sent from the UI too
    max_length = 1500
 
-   textgen.generate_to_file(tokens_file_path, n=1, max_gen_length=max_length, temperature=temperature, prefix=prefix)
+   # the candidates join the batch of the scheduler, along with the boards of the other requests;
+   # the scheduler is the only user of the model, so the model handle is not locked;
+   # candidates are decoded as they are generated, one that cannot be decoded is dropped at once
+   textgen, board_grammar, scheduler = models.get('textgenrnn', timeout=MODEL_WAIT_TIMEOUT).model
+   errors = []
+   token_strings = scheduler.generate(n=NUM_CANDIDATE_BOARDS, max_gen_length=max_length, temperature=temperature,
+                                      prefix=prefix, grammar=board_grammar, decoder=CompactBoardStreamDecoder,
+                                      timeout=GENERATION_TIMEOUT, errors=errors)
+   for e in errors:
+      print("Discarding generated board:", e)
 
-   # decode the generated string
+   # decode the generated strings, the first candidate that makes a valid board wins
    tokenizer = CompactBoardTokenizer()
-   with open(tokens_file_path, 'r', encoding='utf-8') as tf:
-      token_string = tf.read()
-   board_root_elem = tokenizer.TokenStringToBoard(token_string)
-   brdFile.getEagleBoardFromCondensed(board_root_elem)
+   token_strings = [token_string for token_string in token_strings if token_string]
+   board_root_elem = None
+   for token_string in token_strings:
+      try:
+         board_root_elem = tokenizer.TokenStringToBoard(token_string)
+         brdFile.getEagleBoardFromCondensed(board_root_elem)
+         break
+      except Exception as e:
+         print("Discarding generated board:", e)
+         board_root_elem = None
+   if board_root_elem is None:
+      raise Exception("None of the generated boards could be decoded")
    brdFile.write_board(board_root_elem, board_file_path)
 
-   # TODO: automatically cleanup the temp folder every now and then to free up space
-
    return board_file_name
\ No newline at end of file
@@ -42,6 +42,8 @@ $(function() {
 var uploadedFilePath = undefined;
 // the latest generated file (received either as a generated or completed file)
 var generatedFilePath = undefined;
+// how often (ms) the status of a generation job is polled
+var JOB_POLL_INTERVAL = 1000;
 
 function changeMode(modeName)
 {
@@ -120,7 +122,42 @@ function generateNewBoard()
       contentType: "application/json"
    }
    var promise = $.ajax(req);
-   promise.then(requestBoardRendering, serverError);
+   promise.then(showNewBoard, serverError);
+}
+
+// a board from the pool of the server comes already rendered, otherwise it is generated by a job
+function showNewBoard(response)
+{
+   if (response.jobId != undefined) {
+      waitForJob(response);
+      return;
+   }
+   generatedFilePath = response.path;
+   renderImageSuccess({path: response.png});
+}
+
+// generations run as jobs on the server: poll the job until it is done, then render its board
+function waitForJob(response)
+{
+   pollJob(response.jobId, undefined);
+}
+
+function pollJob(jobId, lastMessage)
+{
+   var promise = $.ajax({url: "/jobs/" + jobId, method: "get", dataType: "json"});
+   promise.then(function(job) {
+      if (job.status == "done") {
+         $.ajax({url: "/jobs/" + jobId + "/result", method: "get", dataType: "json"})
+            .then(requestBoardRendering, serverError);
+      } else if (job.status == "failed") {
+         serverError({responseText: "Error in generating the board: " + job.error});
+      } else {
+         var message = (job.position > 0) ? "Waiting for " + job.position + " other board(s)..." : "Generating board...";
+         if (message != lastMessage && (lastMessage != undefined || job.position > 0))
+            showToastr('success', message);
+         setTimeout(function() { pollJob(jobId, message); }, JOB_POLL_INTERVAL);
+      }
+   }, serverError);
 }
 
 function suggestBoardCompletionOnUpload(response)
@@ -149,7 +186,7 @@ function suggestBoardCompletion(filePath)
       data: JSON.stringify({fileName: filePath})
    }
    var promise = $.ajax(req);
-   promise.then(requestBoardRendering, serverError);
+   promise.then(waitForJob, serverError);
 }
 
 function downloadGeneratedFile()
@@ -1,18 +1,67 @@
 import xmltodict
+import lxml.etree as etree
 import copy
+import io
 import os
 from datetime import datetime
 
 from eagle2svg import svg_common, eagle_element, eagle_types
 
 
+def get_line_writer(writer=None):
+    '''Returns a function writing one line of SVG: to writer (anything with a write() method, e.g.
+    io.StringIO or an opened file) or, without a writer, to the standard output'''
+    if writer is None:
+        return print
+    def write(line):
+        writer.write(line)
+        writer.write('\n')
+    return write
+
+
+def element_to_dict(element):
+    '''Converts an lxml element into the structure xmltodict.parse returns for it: attributes as '@name',
+    repeated children as lists, text as a string (or '#text' next to attributes/children), None if empty'''
+    result = {}
+    for name, value in element.attrib.items():
+        result['@' + name] = value
+    text = [element.text] if element.text else []
+    for child in element:
+        if child.tail:
+            text.append(child.tail)
+        # comments and processing instructions are skipped, like xmltodict does
+        if not isinstance(child.tag, str):
+            continue
+        value = element_to_dict(child)
+        if child.tag not in result:
+            result[child.tag] = value
+        elif isinstance(result[child.tag], list):
+            result[child.tag].append(value)
+        else:
+            result[child.tag] = [result[child.tag], value]
+    text = ''.join(text).strip()
+    if text:
+        if len(result) == 0:
+            return text
+        result['#text'] = text
+    return result if len(result) > 0 else None
+
+
+def named_arrays(data):
+    '''named_array of a section that may appear more than once (a list, None for the empty ones)'''
+    items = []
+    for section in eagle_types.array(data):
+        items.extend(eagle_types.named_array(section))
+    return items
+
+
 class EagleFileBase(object):
    def __init__(self, data):
       self.libraries = {}
       # if no libraries, return
-      if 'libraries' not in data or data['libraries'][0] is None:
+      if 'libraries' not in data:
          return
-      for library_data in eagle_types.named_array(data['libraries']):
+      for library_data in named_arrays(data['libraries']):
          library = eagle_element.Library(library_data)
          if library.name in self.libraries:
                self.libraries[library.name].append(library)
@@ -23,11 +72,12 @@ class EagleFileBase(object):
 class Board(EagleFileBase):
     def __init__(self, data):
       super(Board, self).__init__(data)
-      self.plain = eagle_element.Plain(data['plain'])
+      # an empty <plain/> (e.g. a generated board with nothing on it) parses as None
+      self.plain = eagle_element.Plain(data['plain'] if data['plain'] is not None else {})
 
       self.elements = {}
-      if 'elements' in data and data['elements'][0] is not None: # if any elements
-         for element_data in eagle_types.named_array(data['elements']):
+      if 'elements' in data: # if any elements
+         for element_data in named_arrays(data['elements']):
                element = eagle_element.Element(element_data)
                self.elements[element.name] = element
       self.signals = {}
@@ -41,7 +91,8 @@ class Board(EagleFileBase):
     def render(self,
                sheet=0,
                layers={},
-               replace={}):
+               replace={},
+               writer=None):
         replace2 = copy.deepcopy(replace)
         view_box = svg_common.ViewBox()
         self.plain.render(replace=replace2,
@@ -60,23 +111,24 @@ class Board(EagleFileBase):
         view_box.x2 = view_box.x2 + 1
         view_box.y2 = view_box.y2 + 1
 
-        print('<?xml version="1.0"?>')
-        print('<svg version="1.1" xmlns="http://www.w3.org/2000/svg"'
+        write = get_line_writer(writer)
+        write('<?xml version="1.0"?>')
+        write('<svg version="1.1" xmlns="http://www.w3.org/2000/svg"'
               + ' viewBox="%f %f %f %f" width="%fmm" height="%fmm">'
               % (view_box.x1, view_box.y1,
                  view_box.x2 - view_box.x1, view_box.y2 - view_box.y1,
                  view_box.x2 - view_box.x1, view_box.y2 - view_box.y1))
-        print('<style type="text/css">:root{background-color: black;}'
+        write('<style type="text/css">:root{background-color: black;}'
               + ' *{font-family:Consolas, \'Courier New\', '
               + 'Courier, Monaco, monospace;}</style>')
-        print('<rect x="%f" y="%f" width="%f" height="%f" fill="black"/>'
+        write('<rect x="%f" y="%f" width="%f" height="%f" fill="black"/>'
               % (view_box.x1, view_box.y1,
                  view_box.x2 - view_box.x1, view_box.y2 - view_box.y1))
         for layer in layers:
             if layer in view_box.layers:
                 for line in view_box.layers[layer]:
-                    print(line)
-        print('</svg>')
+                    write(line)
+        write('</svg>')
 
 
 class Schematic(EagleFileBase):
@@ -95,7 +147,8 @@ class Schematic(EagleFileBase):
     def render(self,
                sheet=0,
                layers={},
-               replace={}):
+               replace={},
+               writer=None):
         replace2 = copy.deepcopy(replace)
         replace2['>SHEET'] = str(sheet + 1) + '/' + str(len(self.sheets))
         view_box = svg_common.ViewBox()
@@ -109,29 +162,45 @@ class Schematic(EagleFileBase):
         view_box.x2 = view_box.x2 + 1
         view_box.y2 = view_box.y2 + 1
 
-        print('<?xml version="1.0"?>')
-        print('<svg version="1.1" xmlns="http://www.w3.org/2000/svg"'
+        write = get_line_writer(writer)
+        write('<?xml version="1.0"?>')
+        write('<svg version="1.1" xmlns="http://www.w3.org/2000/svg"'
               + ' viewBox="%f %f %f %f" width="%fmm" height="%fmm">'
               % (view_box.x1, view_box.y1,
                  view_box.x2 - view_box.x1, view_box.y2 - view_box.y1,
                  view_box.x2 - view_box.x1, view_box.y2 - view_box.y1))
-        print('<style type="text/css">:root{background-color: white;}'
+        write('<style type="text/css">:root{background-color: white;}'
               + ' *{font-family:Consolas, \'Courier New\','
               + ' Courier, Monaco, monospace;}</style>')
-        print('<rect x="%f" y="%f" width="%f" height="%f" fill="white"/>'
+        write('<rect x="%f" y="%f" width="%f" height="%f" fill="white"/>'
               % (view_box.x1, view_box.y1,
                  view_box.x2 - view_box.x1, view_box.y2 - view_box.y1))
         for layer in layers:
             if layer in view_box.layers:
                 for line in view_box.layers[layer]:
-                    print(line)
-        print('</svg>')
+                    write(line)
+        write('</svg>')
 
 
 class Eagle(object):
-    def __init__(self, filename):
-        f = open(filename)
-        data = xmltodict.parse(f.read())
+    def __init__(self, source, name='board'):
+        '''Reads an Eagle file. source is a file name, the XML contents (bytes) or an lxml element (the
+        eagle root or its tree), the last two are converted in memory without any temporary file'''
+        self.replace = {}
+        if isinstance(source, bytes):
+            data = xmltodict.parse(source)
+        elif isinstance(source, (etree._Element, etree._ElementTree)):
+            root = source.getroot() if isinstance(source, etree._ElementTree) else source
+            data = {root.tag: element_to_dict(root)}
+        else:
+            with open(source) as f:
+                data = xmltodict.parse(f.read())
+            name, ext = os.path.splitext(os.path.basename(source))
+            self.replace['>LAST_DATE_TIME'] = datetime.fromtimestamp(
+                int(os.path.getmtime(source)))
+        self.replace['>DRAWING_NAME'] = name
+        if '>LAST_DATE_TIME' not in self.replace:
+            self.replace['>LAST_DATE_TIME'] = datetime.now().replace(microsecond=0)
 
         self.layers = data['eagle']['drawing']['layers']
         if 'schematic' in data['eagle']['drawing']:
@@ -139,13 +208,15 @@ class Eagle(object):
         if 'board' in data['eagle']['drawing']:
             self.data = Board(data['eagle']['drawing']['board'])
 
-        self.replace = {}
-        self.replace['>DRAWING_NAME'], ext = os.path.splitext(
-            os.path.basename(filename))
-        self.replace['>LAST_DATE_TIME'] = datetime.fromtimestamp(
-            int(os.path.getmtime(filename)))
-
-    def render(self, sheet=0, layers={}):
+    def render(self, sheet=0, layers={}, writer=None):
+        '''Renders a sheet as SVG, to writer (see get_line_writer) or to the standard output'''
         return self.data.render(sheet=sheet,
                                 layers=layers,
-                                replace=self.replace)
+                                replace=self.replace,
+                                writer=writer)
+
+    def render_to_string(self, sheet=0, layers={}):
+        '''Renders a sheet and returns the SVG as a string'''
+        writer = io.StringIO()
+        self.render(sheet, layers, writer)
+        return writer.getvalue()
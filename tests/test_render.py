@@ -0,0 +1,28 @@
+import os, sys
+root_folder = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(root_folder)
+from BoardOperations import brdFile, render
+from BoardTokenize.CompactBoardTokenizer import CompactBoardTokenizer
+
+SAMPLE_BOARD = os.path.join(root_folder, "Web", "static", "files", "test_completion.brd")
+
+def test_render_after_completing_board_twice(tmp_path):
+   '''The Web app completes a generated board before writing it, then again before rendering it'''
+   root = brdFile.getCondensedBoardFromEagle(brdFile.read_board_root(SAMPLE_BOARD))
+   brdFile.getEagleBoardFromCondensed(root)
+   board_file = str(tmp_path / "board.brd")
+   brdFile.write_board(root, board_file)
+
+   root = brdFile.read_board_root(board_file)
+   brdFile.getEagleBoardFromCondensed(root)
+   assert len(root.findall('.//drawing/board/libraries')) == 1
+   assert len(root.findall('.//drawing/board/elements')) == 1
+
+   svg = render.convertCondensedBoardToSvgString(root)
+   assert svg.startswith('<?xml') and svg.rstrip().endswith('</svg>')
+
+def test_render_empty_board():
+   '''A generated board can end right after its (empty) <plain>'''
+   root = CompactBoardTokenizer().TokenStringToBoard('D B N')
+   svg = render.convertCondensedBoardToSvgString(root)
+   assert svg.rstrip().endswith('</svg>')